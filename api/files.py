@@ -13,13 +13,13 @@ async def get_file_content(url):
         file_content = pybase64.b64decode(base64_data)
         return file_content, mime_type
     else:
-        client = Client()
+        client = Client(proxy=None if cf_file_url else export_proxy_url)
         try:
             if cf_file_url:
                 body = {"file_url": url}
                 r = await client.post(cf_file_url, timeout=60, json=body)
             else:
-                r = await client.get(url, proxy=export_proxy_url, timeout=60)
+                r = await client.get(url, timeout=60)
             if r.status_code != 200:
                 return None, None
             file_content = r.content
@@ -1,5 +1,7 @@
 import math
+import re
 
+import regex
 import tiktoken
 
 
@@ -84,3 +86,99 @@ async def split_tokens_from_content(content, max_tokens, model=None):
         return content, max_tokens, "length"
     else:
         return content, len_encoded_content, "stop"
+
+
+def get_encoding(model=None):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# 在预分词边界处切分，边界前的 token 不会再受后续文本影响，每次只需编码新增的文本
+# 非空白字符后紧跟 " " 加非空白字符时，空格前必然是边界
+# cl100k_base、o200k_base 中连续换行属于同一个预分词，换行后紧跟非空白字符处必然是边界
+# o200k_base 的标点预分词会跨过换行吞掉后面的 "/"（如 ".\n/"），换行后紧跟 "/" 时不切分
+# 更早的编码在文本末尾会合并连续换行，只在两侧均为非空白字符的单个换行处切分
+paragraph_boundary = re.compile(r"\n(?=[^\s/])|(?<=\S)(?= \S)")
+line_boundary = re.compile(r"(?<=\S)\n(?=\S)|(?<=\S)(?= \S)")
+# 中文等不含空格、换行的文本没有上述边界，pending 超过该长度时按编码自身的预分词切分
+pending_limit = 256
+# 预分词的结束位置最多受其后 3 个字符影响（如 "'ll"），留出余量的边界不会再变化
+pending_margin = 16
+
+
+class TokenCounter:
+    def __init__(self, model=None):
+        self.encoding = get_encoding(model)
+        self.boundary = paragraph_boundary if self.encoding.name in ("cl100k_base", "o200k_base") else line_boundary
+        self.pattern = regex.compile(self.encoding._pat_str)
+        self.parts = []
+        self.length = 0
+        self.tokens = []
+        self.pending = ""
+        self.pending_tokens = []
+
+    def feed(self, text):
+        if not text:
+            return
+        self.parts.append(text)
+        self.length += len(text)
+        # 新文本可能与 pending 末尾组成边界，从 pending 的最后一个字符开始查找
+        start = len(self.pending)
+        self.pending += text
+        cut = 0
+        for match in self.boundary.finditer(self.pending, max(start - 1, 0)):
+            cut = match.end()
+        if not cut and len(self.pending) > pending_limit:
+            cut = self.fallback_cut()
+        if cut:
+            self.tokens.extend(self.encoding.encode(self.pending[:cut], disallowed_special=()))
+            self.pending = self.pending[cut:]
+        self.pending_tokens = None
+
+    def fallback_cut(self):
+        # 切分点前一个字符不能是空白，否则单独编码时会按文本末尾的空白重新分词
+        end = len(self.pending) - pending_margin
+        cut = 0
+        for match in self.pattern.finditer(self.pending):
+            if match.end() > end:
+                break
+            if not self.pending[match.end() - 1].isspace():
+                cut = match.end()
+        if not cut:
+            # 整段只有一个预分词时无法精确切分，强制切分，计数误差不超过切分处的一个 token
+            cut = end
+        return cut
+
+    def pending_encoded(self):
+        if self.pending_tokens is None:
+            self.pending_tokens = self.encoding.encode(self.pending, disallowed_special=())
+        return self.pending_tokens
+
+    def count(self):
+        return len(self.tokens) + len(self.pending_encoded())
+
+    def text(self):
+        return "".join(self.parts)
+
+    # 与 split_tokens_from_content 的结果一致
+    def split(self, max_tokens):
+        tokens = self.tokens + self.pending_encoded()
+        if len(tokens) >= max_tokens:
+            return self.encoding.decode(tokens[:max_tokens]), max_tokens, "length"
+        else:
+            return self.text(), len(tokens), "stop"
+
+
+if __name__ == "__main__":
+    # 回答中出现特殊 token 文本时按普通文本计数，不能抛出异常
+    text = "Models end with <|endoftext|> as plain text.\nThe rest <|endofprompt|> still counts."
+    counter = TokenCounter("gpt-4o")
+    for i in range(0, len(text), 5):
+        counter.feed(text[i:i + 5])
+    expected = counter.encoding.encode(text, disallowed_special=())
+    assert counter.count() == len(expected), (counter.count(), len(expected))
+    assert counter.split(10) == (counter.encoding.decode(expected[:10]), 10, "length")
+    assert counter.split(1 << 30) == (text, len(expected), "stop")
+    print(f"special token text: {counter.count()} tokens")
@@ -7,18 +7,29 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI, Request, Depends, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.templating import Jinja2Templates
 from starlette.background import BackgroundTask
 from starlette.responses import RedirectResponse, Response
 
 from chatgpt.ChatService import ChatService
-from chatgpt.authorization import refresh_all_tokens, verify_token, get_req_token
+from chatgpt.ark0seReservoir import ark0se_reservoir
+from chatgpt.authorization import refresh_all_tokens, verify_token, get_req_token, refresh_status
+from chatgpt.databases import init_db_pools, close_db_pools, check_db_pools, get_db_pool_stats, \
+    start_auth_key_listener, publish_auth_key_invalidation
 import chatgpt.globals as globals
+from chatgpt.powSolver import pow_solver
+from chatgpt.proofofWork import start_dpl_refresher
+from chatgpt.requirementsReservoir import requirements_reservoir
 from chatgpt.reverseProxy import chatgpt_reverse_proxy
+from chatgpt.sentinelPrefetch import sentinel_prefetch
+from chatgpt.warmup import start_warmup, warmup_status
+from utils.Client import session_pool
+from utils.balancer import proxy_balancer, backend_router
 from utils.Logger import logger
 from utils.config import api_prefix, scheduled_refresh, enable_gateway
+from utils.relay import stream_relay
 from utils.retry import async_retry
 
 warnings.filterwarnings("ignore")
@@ -39,6 +50,16 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def app_start():
+    try:
+        await init_db_pools()
+        logger.info(f"Database pools health: {await check_db_pools()}")
+    except Exception as e:
+        logger.error(f"Failed to create database pools: {e}")
+    # 监听自带重连，不依赖连接池是否创建成功
+    start_auth_key_listener()
+    pow_solver.start()
+    start_warmup()
+    await start_dpl_refresher()
     if scheduled_refresh:
         scheduler.add_job(id='refresh', func=refresh_all_tokens, trigger='cron', hour=3, minute=0, day='*/4',
                           kwargs={'force_refresh': True})
@@ -46,6 +67,13 @@ async def app_start():
         asyncio.get_event_loop().call_later(0, lambda: asyncio.create_task(refresh_all_tokens(force_refresh=False)))
 
 
+@app.on_event("shutdown")
+async def app_stop():
+    await close_db_pools()
+    await session_pool.close()
+    pow_solver.shutdown()
+
+
 async def to_send_conversation(request_data, req_token):
     chat_service = ChatService(req_token)
     try:
@@ -63,8 +91,12 @@ async def to_send_conversation(request_data, req_token):
 
 async def process(request_data, req_token):
     chat_service = await to_send_conversation(request_data, req_token)
-    await chat_service.prepare_send_conversation()
-    res = await chat_service.send_conversation()
+    try:
+        await chat_service.prepare_send_conversation()
+        res = await chat_service.send_conversation()
+    except Exception:
+        await chat_service.close_client()
+        raise
     return chat_service, res
 
 
@@ -89,8 +121,7 @@ async def send_conversation(request: Request, req_token: str = Depends(oauth2_sc
     chat_service, res = await async_retry(process, request_data, req_token)
     try:
         if isinstance(res, types.AsyncGeneratorType):
-            background = BackgroundTask(chat_service.close_client)
-            return StreamingResponse(res, media_type="text/event-stream", background=background)
+            return stream_relay.response(request, res, chat_service.close_client)
         else:
             background = BackgroundTask(chat_service.close_client)
             return JSONResponse(res, media_type="application/json", background=background)
@@ -154,6 +185,57 @@ async def add_token(token: str):
     return {"status": "success", "tokens_count": tokens_count}
 
 
+@app.get(f"/{api_prefix}/tokens/refresh" if api_prefix else "/tokens/refresh")
+async def refresh_progress():
+    return {"status": "success", **refresh_status}
+
+
+@app.get(f"/{api_prefix}/proxies" if api_prefix else "/proxies")
+async def proxies_stats():
+    return {"status": "success", "proxies": proxy_balancer.stats()}
+
+
+@app.get(f"/{api_prefix}/backends" if api_prefix else "/backends")
+async def backends_stats():
+    return {"status": "success", "backends": backend_router.stats()}
+
+
+@app.get(f"/{api_prefix}/streams" if api_prefix else "/streams")
+async def streams_stats():
+    return {"status": "success", **stream_relay.stats()}
+
+
+@app.get(f"/{api_prefix}/db/stats" if api_prefix else "/db/stats")
+async def db_stats():
+    return {"status": "success", "health": await check_db_pools(), "pools": get_db_pool_stats()}
+
+
+@app.post(f"/{api_prefix}/auth_keys/invalidate" if api_prefix else "/auth_keys/invalidate")
+async def invalidate_auth_keys(auth_key: str = Form(...), refresh: bool = Form(False)):
+    auth_keys = [key.strip() for key in auth_key.split(",") if key.strip()]
+    if not auth_keys:
+        raise HTTPException(status_code=400, detail="auth_key is required")
+    try:
+        receivers = {key: await publish_auth_key_invalidation(key, refresh) for key in auth_keys}
+    except Exception as e:
+        logger.error(f"Failed to invalidate auth keys: {e}")
+        raise HTTPException(status_code=500, detail="Server error")
+    return {"status": "success", "refresh": refresh, "receivers": receivers}
+
+
+@app.get(f"/{api_prefix}/pow/stats" if api_prefix else "/pow/stats")
+async def pow_stats():
+    return {"status": "success", **pow_solver.stats(), "requirements": requirements_reservoir.stats(),
+            "sentinel": sentinel_prefetch.stats(), "ark0se": ark0se_reservoir.stats()}
+
+
+@app.get(f"/{api_prefix}/ready" if api_prefix else "/ready")
+async def ready():
+    if not warmup_status["ready"]:
+        return JSONResponse({"status": "warming_up", **warmup_status}, status_code=503)
+    return {"status": "ready", **warmup_status}
+
+
 @app.get(f"/{api_prefix}/v1/models" if api_prefix else "/v1/models")
 async def models():
     models ={
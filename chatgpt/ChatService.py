@@ -1,24 +1,25 @@
 import asyncio
 import json
-import random
 import uuid
 
+from curl_cffi.requests import Cookies
 from fastapi import HTTPException
-from starlette.concurrency import run_in_threadpool
 
 from api.files import get_image_size, get_file_extension, determine_file_use_case
 from api.models import model_proxy
+from chatgpt.ark0seReservoir import ark0se_reservoir
 from chatgpt.authorization import get_req_token, verify_token, get_ua
 from chatgpt.chatFormat import api_messages_to_chat, stream_response, format_not_stream_response, head_process_response
 from chatgpt.chatLimit import check_is_limit, handle_request_limit
-from chatgpt.proofofWork import get_config, get_dpl, get_answer_token, get_requirements_token
+from chatgpt.powSolver import pow_solver
+from chatgpt.requirementsReservoir import requirements_reservoir
+from chatgpt.sentinelPrefetch import sentinel_prefetch
+from chatgpt.turnstile import process_turnstile
 
 from utils.Client import Client
+from utils.balancer import proxy_balancer, backend_router
 from utils.Logger import logger
 from utils.config import (
-    proxy_url_list,
-    chatgpt_base_url_list,
-    ark0se_token_url_list,
     history_disabled,
     pow_difficulty,
     conversation_only,
@@ -28,6 +29,8 @@ from utils.config import (
     auth_key,
     user_agents_list,
     turnstile_solver_url,
+    turnstile_mode,
+    sentinel_timeout,
 )
 
 
@@ -76,14 +79,27 @@ class ChatService:
         self.max_tokens = self.data.get("max_tokens", 2147483647)
         if not isinstance(self.max_tokens, int):
             self.max_tokens = 2147483647
+        stream_options = self.data.get("stream_options") or {}
+        self.include_usage = isinstance(stream_options, dict) and stream_options.get("include_usage") is True
 
-        self.proxy_url = random.choice(proxy_url_list) if proxy_url_list else None
-        self.host_url = random.choice(chatgpt_base_url_list) if chatgpt_base_url_list else "https://chatgpt.com"
-        self.ark0se_token_url = random.choice(ark0se_token_url_list) if ark0se_token_url_list else None
+        self.sentinel = None if conversation_only else sentinel_prefetch.pop(self)
+        self.set_session(self.sentinel)
+
+    def set_session(self, sentinel=None):
+        if sentinel:
+            self.proxy_url = sentinel["proxy_url"]
+            self.host_url = sentinel["host_url"]
+            self.oai_device_id = sentinel["oai_device_id"]
+        else:
+            self.proxy_url = proxy_balancer.choose()
+            self.host_url = backend_router.choose() or "https://chatgpt.com"
+            self.oai_device_id = str(uuid.uuid4())
 
         self.s = Client(proxy=self.proxy_url, impersonate=self.ua.get("impersonate", "safari15_3"))
+        if sentinel:
+            # 沿用 sentinel 请求返回的 cookie，对话与 sentinel 请求共用同一个 cookie jar
+            self.s.cookies.update(sentinel["cookies"])
 
-        self.oai_device_id = str(uuid.uuid4())
         self.persona = None
         self.ark0se_token = None
         self.proof_token = None
@@ -121,8 +137,6 @@ class ChatService:
         if auth_key:
             self.base_headers['authkey'] = auth_key
 
-        await get_dpl(self)
-
     async def set_model(self):
         self.origin_model = self.data.get("model", "gpt-3.5-turbo-0125")
         self.resp_model = model_proxy.get(self.origin_model, self.origin_model)
@@ -156,119 +170,182 @@ class ChatService:
     async def get_chat_requirements(self):
         if conversation_only:
             return None
+        try:
+            if self.sentinel:
+                logger.info(f"Use prefetched chat requirements from {self.host_url}")
+                resp = self.sentinel["resp"]
+                await self.check_chat_requirements(resp)
+                self.chat_token = self.sentinel["chat_token"]
+                self.proof_token = self.sentinel["proof_token"]
+                self.turnstile_token = self.sentinel["turnstile_token"]
+            else:
+                resp = await self.request_chat_requirements()
+                await self.check_chat_requirements(resp)
+                await self.solve_chat_requirements(resp)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        sentinel_prefetch.schedule(self)
+        return self.chat_token
+
+    async def request_chat_requirements(self):
         url = f'{self.base_url}/sentinel/chat-requirements'
         headers = self.base_headers.copy()
-        try:
-            config = get_config(self.user_agent)
-            p = get_requirements_token(config)
-            data = {'p': p}
+        self.requirements_config, self.requirements_p = requirements_reservoir.get(self.user_agent)
+        data = {'p': self.requirements_p}
+        with backend_router.track(self.host_url) as probe:
             r = await self.s.post(url, headers=headers, json=data, timeout=5)
+            probe.done(r.status_code, spinner=r.status_code != 200 and "cf-spinner-please-wait" in r.text)
+        if r.status_code == 200:
+            return r.json()
+        if "application/json" == r.headers.get("Content-Type", ""):
+            detail = r.json().get("detail", r.json())
+        else:
+            detail = r.text
+        if "cf-spinner-please-wait" in detail:
+            raise HTTPException(status_code=r.status_code, detail="cf-spinner-please-wait")
+        if r.status_code == 429:
+            raise HTTPException(status_code=r.status_code, detail="rate-limit")
+        raise HTTPException(status_code=r.status_code, detail=detail)
+
+    async def check_chat_requirements(self, resp):
+        if check_model:
+            r = await self.s.get(f'{self.base_url}/models', headers=self.base_headers.copy(), timeout=5)
             if r.status_code == 200:
-                resp = r.json()
-
-                if check_model:
-                    r = await self.s.get(f'{self.base_url}/models', headers=headers, timeout=5)
-                    if r.status_code == 200:
-                        models = r.json().get('models')
-                        if not any(self.req_model in model.get("slug", "") for model in models):
-                            logger.error(f"Model {self.req_model} not support.")
-                            raise HTTPException(
-                                status_code=404,
-                                detail={
-                                    "message": f"The model `{self.origin_model}` does not exist or you do not have access to it.",
-                                    "type": "invalid_request_error",
-                                    "param": None,
-                                    "code": "model_not_found",
-                                },
-                            )
-                    else:
-                        raise HTTPException(status_code=404, detail="Failed to get models")
-                else:
-                    self.persona = resp.get("persona")
-                    if self.persona != "chatgpt-paid":
-                        if self.req_model == "gpt-4":
-                            logger.error(f"Model {self.resp_model} not support for {self.persona}")
-                            raise HTTPException(
-                                status_code=404,
-                                detail={
-                                    "message": f"The model `{self.origin_model}` does not exist or you do not have access to it.",
-                                    "type": "invalid_request_error",
-                                    "param": None,
-                                    "code": "model_not_found",
-                                },
-                            )
-
-                turnstile = resp.get('turnstile', {})
-                turnstile_required = turnstile.get('required')
-                if turnstile_required:
-                    turnstile_dx = turnstile.get("dx")
-                    try:
-                        if turnstile_solver_url:
-                            res = await self.s.post(
-                                turnstile_solver_url, json={"url": "https://chatgpt.com", "p": p, "dx": turnstile_dx}
-                            )
-                            self.turnstile_token = res.json().get("t")
-                    except Exception as e:
-                        logger.info(f"Turnstile ignored: {e}")
-                    # raise HTTPException(status_code=403, detail="Turnstile required")
-
-                ark0se = resp.get('ark' + 'ose', {})
-                ark0se_required = ark0se.get('required')
-                if ark0se_required:
-                    if self.persona == "chatgpt-freeaccount":
-                        ark0se_method = "chat35"
-                    else:
-                        ark0se_method = "chat4"
-                    if not self.ark0se_token_url:
-                        raise HTTPException(status_code=403, detail="Ark0se service required")
-                    ark0se_dx = ark0se.get("dx")
-                    ark0se_client = Client(impersonate=self.ua.get("impersonate", "safari15_3"))
-                    try:
-                        r2 = await ark0se_client.post(
-                            url=self.ark0se_token_url, json={"blob": ark0se_dx, "method": ark0se_method}, timeout=15
-                        )
-                        r2esp = r2.json()
-                        logger.info(f"ark0se_token: {r2esp}")
-                        if r2esp.get('solved', True):
-                            self.ark0se_token = r2esp.get('token')
-                        else:
-                            raise HTTPException(status_code=403, detail="Failed to get Ark0se token")
-                    except Exception:
-                        raise HTTPException(status_code=403, detail="Failed to get Ark0se token")
-                    finally:
-                        await ark0se_client.close()
-
-                proofofwork = resp.get('proofofwork', {})
-                proofofwork_required = proofofwork.get('required')
-                if proofofwork_required:
-                    proofofwork_diff = proofofwork.get("difficulty")
-                    if proofofwork_diff <= pow_difficulty:
-                        raise HTTPException(status_code=403, detail=f"Proof of work difficulty too high: {proofofwork_diff}")
-                    proofofwork_seed = proofofwork.get("seed")
-                    self.proof_token, solved = await run_in_threadpool(
-                        get_answer_token, proofofwork_seed, proofofwork_diff, config
+                models = r.json().get('models')
+                if not any(self.req_model in model.get("slug", "") for model in models):
+                    logger.error(f"Model {self.req_model} not support.")
+                    raise HTTPException(
+                        status_code=404,
+                        detail={
+                            "message": f"The model `{self.origin_model}` does not exist or you do not have access to it.",
+                            "type": "invalid_request_error",
+                            "param": None,
+                            "code": "model_not_found",
+                        },
+                    )
+            else:
+                raise HTTPException(status_code=404, detail="Failed to get models")
+        else:
+            self.persona = resp.get("persona")
+            if self.persona != "chatgpt-paid":
+                if self.req_model == "gpt-4":
+                    logger.error(f"Model {self.resp_model} not support for {self.persona}")
+                    raise HTTPException(
+                        status_code=404,
+                        detail={
+                            "message": f"The model `{self.origin_model}` does not exist or you do not have access to it.",
+                            "type": "invalid_request_error",
+                            "param": None,
+                            "code": "model_not_found",
+                        },
                     )
-                    if not solved:
-                        raise HTTPException(status_code=403, detail="Failed to solve proof of work")
 
-                self.chat_token = resp.get('token')
-                if not self.chat_token:
-                    raise HTTPException(status_code=403, detail=f"Failed to get chat token: {r.text}")
-                return self.chat_token
+    # turnstile、ark0se、proofofwork 互不依赖，并发求解；必需的一项失败或超时即取消其余
+    # turnstile 可选，只等待必需的两项，之后最多再给它 1 秒，不足则放弃
+    async def solve_chat_requirements(self, resp):
+        turnstile_task = asyncio.create_task(self.solve_turnstile(resp.get('turnstile', {})))
+        required_tasks = [
+            asyncio.create_task(self.solve_ark0se(resp.get('ark' + 'ose', {}))),
+            asyncio.create_task(self.solve_proofofwork(resp.get('proofofwork', {}))),
+        ]
+        tasks = [turnstile_task] + required_tasks
+        deadline = asyncio.get_running_loop().time() + sentinel_timeout
+        try:
+            done, pending = await asyncio.wait(required_tasks, timeout=sentinel_timeout,
+                                               return_when=asyncio.FIRST_EXCEPTION)
+            errors = [task.exception() for task in done if task.exception()]
+            if errors:
+                raise errors[0]
+            if pending:
+                raise HTTPException(status_code=403, detail=f"Sentinel challenges not solved in {sentinel_timeout}s")
+            if not turnstile_task.done():
+                remaining = deadline - asyncio.get_running_loop().time()
+                await asyncio.wait([turnstile_task], timeout=min(max(remaining, 0), 1))
+                if not turnstile_task.done():
+                    logger.info("Turnstile ignored: not solved before the required challenges")
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self.chat_token = resp.get('token')
+        if not self.chat_token:
+            raise HTTPException(status_code=403, detail=f"Failed to get chat token: {resp}")
+
+    async def solve_turnstile(self, turnstile):
+        turnstile_required = turnstile.get('required')
+        if turnstile_required:
+            turnstile_dx = turnstile.get("dx")
+            try:
+                if turnstile_mode == "local":
+                    self.turnstile_token = await pow_solver.run(process_turnstile, turnstile_dx, self.requirements_p) or None
+                elif turnstile_mode == "remote" and turnstile_solver_url:
+                    res = await self.s.post(
+                        turnstile_solver_url, json={"url": "https://chatgpt.com", "p": self.requirements_p, "dx": turnstile_dx}
+                    )
+                    self.turnstile_token = res.json().get("t")
+            except Exception as e:
+                logger.info(f"Turnstile ignored: {e}")
+            # raise HTTPException(status_code=403, detail="Turnstile required")
+
+    async def solve_ark0se(self, ark0se):
+        ark0se_required = ark0se.get('required')
+        if ark0se_required:
+            if self.persona == "chatgpt-freeaccount":
+                ark0se_method = "chat35"
             else:
-                if "application/json" == r.headers.get("Content-Type", ""):
-                    detail = r.json().get("detail", r.json())
-                else:
-                    detail = r.text
-                if "cf-spinner-please-wait" in detail:
-                    raise HTTPException(status_code=r.status_code, detail="cf-spinner-please-wait")
-                if r.status_code == 429:
-                    raise HTTPException(status_code=r.status_code, detail="rate-limit")
-                raise HTTPException(status_code=r.status_code, detail=detail)
-        except HTTPException as e:
-            raise HTTPException(status_code=e.status_code, detail=e.detail)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+                ark0se_method = "chat4"
+            if not ark0se_reservoir:
+                raise HTTPException(status_code=403, detail="Ark0se service required")
+            ark0se_dx = ark0se.get("dx")
+            self.ark0se_token = await ark0se_reservoir.get(
+                ark0se_method, ark0se_dx, self.ua.get("impersonate", "safari15_3")
+            )
+
+    async def solve_proofofwork(self, proofofwork):
+        proofofwork_required = proofofwork.get('required')
+        if proofofwork_required:
+            proofofwork_diff = proofofwork.get("difficulty")
+            if proofofwork_diff <= pow_difficulty:
+                raise HTTPException(status_code=403, detail=f"Proof of work difficulty too high: {proofofwork_diff}")
+            if not pow_solver.admit(proofofwork_diff):
+                raise HTTPException(status_code=403, detail=f"Proof of work too slow: {proofofwork_diff}")
+            proofofwork_seed = proofofwork.get("seed")
+            self.proof_token, solved = await pow_solver.solve(proofofwork_seed, proofofwork_diff, self.requirements_config)
+            if not solved:
+                raise HTTPException(status_code=403, detail="Failed to solve proof of work")
+
+    # 在后台为同一个 access_token 预取下一次请求要用的 requirements，不做模型检查，使用时再检查
+    async def prefetch_chat_requirements(self):
+        service = ChatService.__new__(ChatService)
+        service.req_token = self.req_token
+        service.ua = self.ua
+        service.user_agent = self.user_agent
+        service.access_token = self.access_token
+        service.account_id = self.account_id
+        service.ws = None
+        service.set_session()
+        try:
+            resp = await service.request_chat_requirements()
+            # ark0se token 只能使用一次且依赖 persona，留给请求路径处理
+            if resp.get('ark' + 'ose', {}).get('required'):
+                return None
+            await service.solve_chat_requirements(resp)
+            return {
+                "proxy_url": service.proxy_url,
+                "host_url": service.host_url,
+                "oai_device_id": service.oai_device_id,
+                "cookies": Cookies(service.s.cookies),
+                "resp": resp,
+                "chat_token": service.chat_token,
+                "proof_token": service.proof_token,
+                "turnstile_token": service.turnstile_token,
+            }
+        finally:
+            await service.close_client()
 
     async def prepare_send_conversation(self):
         try:
@@ -329,48 +406,54 @@ class ChatService:
         try:
             url = f'{self.base_url}/conversation'
             stream = self.data.get("stream", False)
-            r = await self.s.post_stream(url, headers=self.chat_headers, json=self.chat_request, timeout=10, stream=True)
-            if r.status_code != 200:
-                rtext = await r.atext()
-                if "application/json" == r.headers.get("Content-Type", ""):
-                    detail = json.loads(rtext).get("detail", json.loads(rtext))
-                    if r.status_code == 429:
-                        check_is_limit(detail, token=self.req_token, model=self.req_model)
-                else:
-                    if "cf-spinner-please-wait" in rtext:
-                        # logger.error(f"Failed to send conversation: cf-spinner-please-wait")
-                        raise HTTPException(status_code=r.status_code, detail="cf-spinner-please-wait")
-                    if r.status_code == 429:
-                        # logger.error(f"Failed to send conversation: rate-limit")
-                        raise HTTPException(status_code=r.status_code, detail="rate-limit")
-                    detail = r.text[:100]
-                # logger.error(f"Failed to send conversation: {detail}")
-                raise HTTPException(status_code=r.status_code, detail=detail)
-
-            content_type = r.headers.get("Content-Type", "")
-            if "text/event-stream" in content_type:
-                res, start = await head_process_response(r.aiter_lines())
-                if not start:
-                    raise HTTPException(
-                        status_code=403,
-                        detail="Our systems have detected unusual activity coming from your system. Please try again later.",
-                    )
-                if stream:
-                    return stream_response(self, res, self.resp_model, self.max_tokens)
+            with backend_router.track(self.host_url) as probe:
+                r = await self.s.post_stream(url, headers=self.chat_headers, json=self.chat_request, timeout=10, stream=True)
+                if r.status_code != 200:
+                    rtext = await r.atext()
+                    probe.done(r.status_code, spinner="cf-spinner-please-wait" in rtext)
+                    if "application/json" == r.headers.get("Content-Type", ""):
+                        detail = json.loads(rtext).get("detail", json.loads(rtext))
+                        if r.status_code == 429:
+                            check_is_limit(detail, token=self.req_token, model=self.req_model)
+                    else:
+                        if "cf-spinner-please-wait" in rtext:
+                            # logger.error(f"Failed to send conversation: cf-spinner-please-wait")
+                            raise HTTPException(status_code=r.status_code, detail="cf-spinner-please-wait")
+                        if r.status_code == 429:
+                            # logger.error(f"Failed to send conversation: rate-limit")
+                            raise HTTPException(status_code=r.status_code, detail="rate-limit")
+                        detail = r.text[:100]
+                    # logger.error(f"Failed to send conversation: {detail}")
+                    raise HTTPException(status_code=r.status_code, detail=detail)
+
+                content_type = r.headers.get("Content-Type", "")
+                if "text/event-stream" in content_type:
+                    res, start = await head_process_response(r.aiter_lines())
+                    probe.done(r.status_code)
+                    if not start:
+                        raise HTTPException(
+                            status_code=403,
+                            detail="Our systems have detected unusual activity coming from your system. Please try again later.",
+                        )
+                    if stream:
+                        return stream_response(self, res, self.resp_model, self.max_tokens)
+                    else:
+                        return await format_not_stream_response(
+                            self,
+                            res,
+                            self.prompt_tokens,
+                            self.max_tokens,
+                            self.resp_model,
+                        )
+                elif "application/json" in content_type:
+                    probe.done(r.status_code)
+                    rtext = await r.atext()
+                    resp = json.loads(rtext)
+                    raise HTTPException(status_code=r.status_code, detail=resp)
                 else:
-                    return await format_not_stream_response(
-                        stream_response(self, res, self.resp_model, self.max_tokens),
-                        self.prompt_tokens,
-                        self.max_tokens,
-                        self.resp_model,
-                    )
-            elif "application/json" in content_type:
-                rtext = await r.atext()
-                resp = json.loads(rtext)
-                raise HTTPException(status_code=r.status_code, detail=resp)
-            else:
-                rtext = await r.atext()
-                raise HTTPException(status_code=r.status_code, detail=rtext)
+                    probe.done(r.status_code)
+                    rtext = await r.atext()
+                    raise HTTPException(status_code=r.status_code, detail=rtext)
         except HTTPException as e:
             raise HTTPException(status_code=e.status_code, detail=e.detail)
         except Exception as e:
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+from utils.Client import Client
+from utils.Logger import logger
+from utils.balancer import BackendRouter
+from utils.cache import TTLCache
+from utils.config import ark0se_token_url_list, ark0se_reservoir_size, ark0se_token_ttl
+
+
+class Ark0seReservoir:
+    def __init__(self, urls, size=ark0se_reservoir_size, ttl=ark0se_token_ttl):
+        # 复用网关的健康度路由和熔断器，按延迟和错误率在多个求解服务间分配请求
+        self.router = BackendRouter(urls)
+        self.size = size
+        self.ttl = ttl
+        self.tokens = TTLCache(ttl=ttl)
+        self.seen = TTLCache(ttl=ttl)
+        self.refilling = {}
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def __bool__(self):
+        return bool(self.router.backends)
+
+    # token 与求解时的 blob 绑定，只把同一 blob 预取的 token 交给后续请求
+    async def get(self, method, blob, impersonate="safari15_3"):
+        key = (method, blob)
+        tokens = self.tokens.get(key, None) or ()
+        now = time.time()
+        while tokens:
+            created, token = tokens.popleft()
+            if now - created < self.ttl:
+                self.hits += 1
+                self.refill(key, impersonate)
+                return token
+        self.misses += 1
+        token = await self.fetch(method, blob, impersonate)
+        # 同一 blob 再次出现时才预取，只出现一次的 blob 不会额外消耗求解
+        if self.seen.get(key, None) is not None:
+            self.refill(key, impersonate)
+        self.seen.set(key, True)
+        return token
+
+    async def fetch(self, method, blob, impersonate="safari15_3"):
+        url = self.router.choose(fail_fast=True)
+        if url is None:
+            self.rejected += 1
+            raise HTTPException(status_code=403, detail="Ark0se service unavailable")
+        client = Client(impersonate=impersonate)
+        try:
+            with self.router.track(url) as probe:
+                r = await client.post(url=url, json={"blob": blob, "method": method}, timeout=15)
+                resp = r.json()
+                # 200 但没有 token 也视为失败，否则熔断器不会打开，预取会不停重试
+                solved = resp.get('solved', True) and bool(resp.get('token'))
+                probe.done(r.status_code if solved else 502)
+            logger.info(f"ark0se_token: {resp}")
+        except Exception as e:
+            logger.error(f"Failed to get Ark0se token from {url}: {e}")
+            raise HTTPException(status_code=403, detail="Failed to get Ark0se token")
+        finally:
+            await client.close()
+        if not solved:
+            raise HTTPException(status_code=403, detail="Failed to get Ark0se token")
+        return resp.get('token')
+
+    def refill(self, key, impersonate):
+        if self.size <= 0 or key in self.refilling:
+            return
+        task = asyncio.create_task(self.fill(key, impersonate))
+        self.refilling[key] = task
+        task.add_done_callback(lambda _: self.refilling.pop(key, None))
+
+    # 失败即停止，由熔断器决定何时恢复
+    async def fill(self, key, impersonate):
+        method, blob = key
+        tokens = self.tokens.get(key, None)
+        if tokens is None:
+            tokens = deque()
+        while len(tokens) < self.size:
+            try:
+                token = await self.fetch(method, blob, impersonate)
+            except HTTPException:
+                return
+            tokens.append((time.time(), token))
+            self.tokens.set(key, tokens)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "blobs": len(self.tokens),
+            "ready": sum(len(tokens) for _, tokens in self.tokens.data.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "endpoints": self.router.stats(),
+        }
+
+
+ark0se_reservoir = Ark0seReservoir(ark0se_token_url_list)
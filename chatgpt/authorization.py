@@ -3,14 +3,17 @@ import json
 import os
 import random
 import re
+import time
 
 import ua_generator
 from fastapi import HTTPException
 
 import chatgpt.globals as globals
-from chatgpt.refreshToken import rt2ac
+from chatgpt.refreshToken import rt2ac, is_refresh_fresh, save_refresh_map
 from utils.Logger import logger
-from utils.config import authorization_list, random_token
+from utils.config import authorization_list, random_token, retry_times, refresh_concurrency, refresh_rate, \
+    refresh_save_batch
+from utils.ratelimit import TokenBucket
 from chatgpt.databases import get_rt_at_key_list
 
 os.environ['PYTHONHASHSEED'] = '0'
@@ -121,12 +124,69 @@ async def verify_token(req_token: str, data) -> tuple:
         raise HTTPException(status_code=403, detail="请使用用户系统提供的key进行请求")
 
 
+refresh_status = {
+    "running": False,
+    "total": 0,
+    "done": 0,
+    "refreshed": 0,
+    "cached": 0,
+    "failed": 0,
+    "started_at": None,
+    "finished_at": None,
+    "eta": None,
+}
+
+
+async def refresh_token_with_retry(token, bucket):
+    for attempt in range(retry_times + 1):
+        await bucket.acquire()
+        try:
+            return await rt2ac(token, force_refresh=True, save=False)
+        except HTTPException:
+            # invalid_grant 等已进入 error_token_list，不再重试
+            if token in globals.error_token_list or attempt == retry_times:
+                raise
+            await asyncio.sleep(random.uniform(0, min(2 ** attempt, 30)))
+
+
 async def refresh_all_tokens(force_refresh=False):
-    for token in list(set(globals.token_list) - set(globals.error_token_list)):
-        if len(token) == 45:
-            try:
-                await asyncio.sleep(2)
-                await rt2ac(token, force_refresh=force_refresh)
-            except HTTPException:
-                pass
-    logger.info("All tokens refreshed.")
+    if refresh_status["running"]:
+        logger.info("Token refresh is already running.")
+        return
+    tokens = [token for token in set(globals.token_list) - set(globals.error_token_list) if len(token) == 45]
+    refresh_status.update(running=True, total=len(tokens), done=0, refreshed=0, cached=0, failed=0,
+                          started_at=time.time(), finished_at=None, eta=None)
+    bucket = TokenBucket(refresh_rate)
+    pending = iter(tokens)
+    unsaved = 0
+
+    async def worker():
+        nonlocal unsaved
+        for token in pending:
+            if not force_refresh and is_refresh_fresh(token):
+                refresh_status["cached"] += 1
+            else:
+                try:
+                    await refresh_token_with_retry(token, bucket)
+                    refresh_status["refreshed"] += 1
+                    unsaved += 1
+                except HTTPException:
+                    refresh_status["failed"] += 1
+            refresh_status["done"] += 1
+            elapsed = time.time() - refresh_status["started_at"]
+            remaining = refresh_status["total"] - refresh_status["done"]
+            refresh_status["eta"] = round(elapsed / refresh_status["done"] * remaining, 1)
+            if unsaved >= refresh_save_batch:
+                unsaved = 0
+                save_refresh_map(globals.refresh_map)
+                logger.info(f"Token refresh progress: {refresh_status['done']}/{refresh_status['total']}, "
+                            f"eta {refresh_status['eta']}s")
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(max(min(refresh_concurrency, len(tokens)), 1))])
+    finally:
+        if unsaved:
+            save_refresh_map(globals.refresh_map)
+        refresh_status.update(running=False, finished_at=time.time(), eta=0)
+    logger.info(f"All tokens refreshed. refreshed: {refresh_status['refreshed']}, cached: {refresh_status['cached']}, "
+                f"failed: {refresh_status['failed']}, {round(refresh_status['finished_at'] - refresh_status['started_at'], 1)}s")
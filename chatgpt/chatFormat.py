@@ -1,5 +1,4 @@
 import asyncio
-import json
 import random
 import re
 import string
@@ -12,33 +11,23 @@ from fastapi import HTTPException
 
 from api.files import get_file_content
 from api.models import model_system_fingerprint
-from api.tokens import split_tokens_from_content, calculate_image_tokens, num_tokens_from_messages
+from api.tokens import calculate_image_tokens, num_tokens_from_messages, TokenCounter
 from utils.Logger import logger
+from utils.codec import codec
 
 moderation_message = "I'm sorry, I cannot provide or engage in any content related to pornography, violence, or any unethical material. If you have any other questions or need assistance, please feel free to let me know. I'll do my best to provide support and assistance."
 
 
-async def format_not_stream_response(response, prompt_tokens, max_tokens, model):
+async def format_not_stream_response(service, response, prompt_tokens, max_tokens, model):
     chat_id = f"chatcmpl-{''.join(random.choice(string.ascii_letters + string.digits) for _ in range(29))}"
     system_fingerprint_list = model_system_fingerprint.get(model, None)
     system_fingerprint = random.choice(system_fingerprint_list) if system_fingerprint_list else None
     created_time = int(time.time())
-    all_text = ""
-    async for chunk in response:
-        try:
-            if chunk.startswith("data: [DONE]"):
-                break
-            elif not chunk.startswith("data: "):
-                continue
-            else:
-                chunk = json.loads(chunk[6:])
-                if not chunk["choices"][0].get("delta"):
-                    continue
-                all_text += chunk["choices"][0]["delta"]["content"]
-        except Exception as e:
-            logger.error(f"Error: {chunk}, error: {str(e)}")
-            continue
-    content, completion_tokens, finish_reason = await split_tokens_from_content(all_text, max_tokens, model)
+    counter = TokenCounter(model)
+    async for item in chat_deltas(service, response, counter, max_tokens):
+        if item is None:
+            break
+    content, completion_tokens, finish_reason = counter.split(max_tokens)
     message = {
         "role": "assistant",
         "content": content,
@@ -76,7 +65,7 @@ async def wss_stream_response(websocket, conversation_id):
         try:
             message = await asyncio.wait_for(websocket.recv(), timeout=10)
             if message:
-                resultObj = json.loads(message)
+                resultObj = codec.loads(message)
                 sequenceId = resultObj.get("sequenceId", None)
                 if not sequenceId:
                     continue
@@ -86,7 +75,7 @@ async def wss_stream_response(websocket, conversation_id):
                 sequenceId = resultObj.get('sequenceId')
                 if sequenceId and sequenceId % 80 == 0:
                     await websocket.send(
-                        json.dumps(
+                        codec.dumps(
                             {"type": "sequenceAck", "sequenceId": sequenceId}
                         )
                     )
@@ -112,7 +101,7 @@ async def head_process_response(response):
     async for chunk in response:
         chunk = chunk.decode("utf-8")
         if chunk.startswith("data: {"):
-            chunk_old_data = json.loads(chunk[6:])
+            chunk_old_data = codec.loads_event(chunk[6:])
             message = chunk_old_data.get("message", {})
             if not message and "error" in chunk_old_data:
                 return response, False
@@ -126,12 +115,44 @@ async def head_process_response(response):
     return response, False
 
 
-async def stream_response(service, response, model, max_tokens):
-    chat_id = f"chatcmpl-{''.join(random.choice(string.ascii_letters + string.digits) for _ in range(29))}"
-    system_fingerprint_list = model_system_fingerprint.get(model, None)
-    system_fingerprint = random.choice(system_fingerprint_list) if system_fingerprint_list else None
-    created_time = int(time.time())
-    completion_tokens = 0
+# 每个 chunk 只有 delta、finish_reason 和消息 id 会变化，其余部分按补全预先编码
+class ChunkEncoder:
+    def __init__(self, chat_id, created, model, system_fingerprint=None, include_usage=False):
+        self.prefix = (b'data: {"id":' + codec.encode(chat_id) + b',"object":"chat.completion.chunk","created":' +
+                       codec.encode(created) + b',"model":' + codec.encode(model))
+        self.head = self.prefix + b',"choices":[{"index":0,"delta":'
+        self.fingerprint = b''
+        if system_fingerprint:
+            self.fingerprint = b',"system_fingerprint":' + codec.encode(system_fingerprint)
+        self.tail = b'}]' + self.fingerprint
+        if include_usage:
+            self.tail += b',"usage":null'
+        self.finish_reasons = {}
+        self.ids = None
+        self.ids_bytes = b''
+
+    def encode(self, delta, finish_reason=None, ids=None):
+        if len(delta) == 1 and "content" in delta:
+            delta_bytes = b'{"content":' + codec.encode(delta["content"]) + b'}'
+        else:
+            delta_bytes = codec.encode(delta)
+        finish_bytes = self.finish_reasons.get(finish_reason)
+        if finish_bytes is None:
+            finish_bytes = b',"logprobs":null,"finish_reason":' + codec.encode(finish_reason)
+            self.finish_reasons[finish_reason] = finish_bytes
+        if ids != self.ids:
+            self.ids = ids
+            self.ids_bytes = b',"message_id":' + codec.encode(ids[0]) + b',"conversation_id":' + codec.encode(ids[1])
+        return b"".join((self.head, delta_bytes, finish_bytes, self.tail, self.ids_bytes, b"}\n\n"))
+
+    # stream_options.include_usage 要求在 [DONE] 前发送 choices 为空的 usage chunk
+    def encode_usage(self, usage):
+        return b"".join((self.prefix, b',"choices":[],"usage":', codec.encode(usage), self.fingerprint, self.ids_bytes,
+                         b"}\n\n"))
+
+
+# 将上游事件转换为 (delta, finish_reason, message_id, conversation_id)，上游结束时产出 None
+async def chat_deltas(service, response, counter, max_tokens):
     len_last_content = 0
     len_last_citation = 0
     last_message_id = None
@@ -140,33 +161,15 @@ async def stream_response(service, response, model, max_tokens):
     model_slug = None
     end = False
 
-    chunk_new_data = {
-        "id": chat_id,
-        "object": "chat.completion.chunk",
-        "created": created_time,
-        "model": model,
-        "choices": [
-            {
-                "index": 0,
-                "delta": {"role": "assistant", "content": ""},
-                "logprobs": None,
-                "finish_reason": None
-            }
-        ]
-    }
-    if system_fingerprint:
-        chunk_new_data["system_fingerprint"] = system_fingerprint
-    yield f"data: {json.dumps(chunk_new_data)}\n\n"
-
     async for chunk in response:
         chunk = chunk.decode("utf-8")
         if end:
             logger.info(f"Response Model: {model_slug}")
-            yield "data: [DONE]\n\n"
+            yield None
             break
         try:
             if chunk.startswith("data: {"):
-                chunk_old_data = json.loads(chunk[6:])
+                chunk_old_data = codec.loads_event(chunk[6:])
                 finish_reason = None
                 message = chunk_old_data.get("message", {})
                 conversation_id = chunk_old_data.get("conversation_id")
@@ -244,10 +247,6 @@ async def stream_response(service, response, model, max_tokens):
 
                     delta = {"content": new_text}
                     last_content_type = outer_content_type
-                    if completion_tokens >= max_tokens:
-                        delta = {}
-                        finish_reason = "length"
-                        end = True
                 elif status == "finished_successfully":
                     if content.get("content_type") == "multimodal_text":
                         parts = content.get("parts", [])
@@ -292,35 +291,63 @@ async def stream_response(service, response, model, max_tokens):
                             continue
                 else:
                     continue
+                if delta.get("content"):
+                    emitted = counter.length
+                    counter.feed(delta["content"])
+                    if counter.count() >= max_tokens:
+                        text, _, _ = counter.split(max_tokens)
+                        delta = {"content": text[emitted:]}
+                        finish_reason = "length"
+                        end = True
                 last_message_id = message_id
                 last_role = role
                 if not end and not delta.get("content"):
                     delta = {"role": "assistant", "content": ""}
-                chunk_new_data["choices"][0]["delta"] = delta
-                chunk_new_data["choices"][0]["finish_reason"] = finish_reason
-                if not service.history_disabled:
-                    chunk_new_data.update({
-                        "message_id": message_id,
-                        "conversation_id": conversation_id,
-                    })
-                completion_tokens += 1
-                yield f"data: {json.dumps(chunk_new_data)}\n\n"
+                yield delta, finish_reason, message_id, conversation_id
             elif chunk.startswith("data: [DONE]"):
                 logger.info(f"Response Model: {model_slug}")
-                yield "data: [DONE]\n\n"
+                yield None
             else:
                 continue
         except Exception as e:
             if chunk.startswith("data: "):
-                chunk_data = json.loads(chunk[6:])
+                chunk_data = codec.loads(chunk[6:])
                 if chunk_data.get("error"):
                     logger.error(f"Error: {chunk_data.get('error')}")
-                    yield "data: [DONE]\n\n"
+                    yield None
                     break
             logger.error(f"Error: {chunk}, details: {str(e)}")
             continue
 
 
+async def stream_response(service, response, model, max_tokens):
+    chat_id = f"chatcmpl-{''.join(random.choice(string.ascii_letters + string.digits) for _ in range(29))}"
+    system_fingerprint_list = model_system_fingerprint.get(model, None)
+    system_fingerprint = random.choice(system_fingerprint_list) if system_fingerprint_list else None
+    created_time = int(time.time())
+    encoder = ChunkEncoder(chat_id, created_time, model, system_fingerprint, service.include_usage)
+    counter = TokenCounter(model)
+    usage_sent = False
+    ids = None
+    yield encoder.encode({"role": "assistant", "content": ""})
+    async for item in chat_deltas(service, response, counter, max_tokens):
+        if item is None:
+            if service.include_usage and not usage_sent:
+                completion_tokens = min(counter.count(), max_tokens)
+                yield encoder.encode_usage({
+                    "prompt_tokens": service.prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": service.prompt_tokens + completion_tokens
+                })
+                usage_sent = True
+            yield b"data: [DONE]\n\n"
+            continue
+        delta, finish_reason, message_id, conversation_id = item
+        if not service.history_disabled:
+            ids = (message_id, conversation_id)
+        yield encoder.encode(delta, finish_reason, ids)
+
+
 def get_url_from_content(content):
     if isinstance(content, str) and content.startswith('http'):
         try:
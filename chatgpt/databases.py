@@ -3,8 +3,22 @@ import aiomysql
 import redis.asyncio as redis
 import json
 import asyncio
-from utils.config import DB_CONFIG, REDIS_CONFIG
-from utils.get_ak import get_ak
+import math
+import random
+import time
+from utils.cache import TTLCache, MISSING
+from utils.config import (
+    DB_CONFIG,
+    REDIS_CONFIG,
+    db_pool_minsize,
+    db_pool_maxsize,
+    redis_max_connections,
+    auth_key_local_cache_size,
+    auth_key_local_ttl,
+    auth_key_negative_ttl,
+    auth_key_early_refresh_beta,
+)
+from utils.get_ak import get_aks
 
 # Redis 键名前缀
 AUTH_KEY_REDIS_PREFIX = 'auth_key:'
@@ -12,66 +26,299 @@ AUTH_KEY_REDIS_PREFIX = 'auth_key:'
 # Redis 缓存过期时间（秒）
 AUTH_KEY_CACHE_EXPIRE = 43200  # 12小时
 
+# auth_key 失效广播频道，所有节点订阅
+AUTH_KEY_INVALIDATE_CHANNEL = 'auth_key:invalidate'
+
+# 进程级连接池，启动时创建，关闭时释放
+redis_pool = None
+redis_client = None
+mysql_pool = None
+mysql_lock = asyncio.Lock()
+
+# 进程内 auth_key 缓存，位于 Redis 之前；不存在的 auth_key 以 None 短时缓存
+auth_key_local_cache = TTLCache(max_size=auth_key_local_cache_size, ttl=auth_key_local_ttl)
+
+# 正在加载中的 auth_key，同一个 key 的并发未命中只由一个协程加载
+auth_key_inflight = {}
+
+# 失效广播订阅任务
+auth_key_listener_task = None
+
+# 后台提前刷新任务，保留引用避免被回收
+auth_key_refresh_tasks = set()
+
+
+async def init_db_pools():
+    global redis_pool, redis_client, mysql_pool
+    if redis_client is None:
+        redis_pool = redis.ConnectionPool(**REDIS_CONFIG, max_connections=redis_max_connections,
+                                          health_check_interval=30, socket_connect_timeout=5)
+        redis_client = redis.Redis(connection_pool=redis_pool)
+    async with mysql_lock:
+        if mysql_pool is None:
+            mysql_pool = await aiomysql.create_pool(**DB_CONFIG, minsize=db_pool_minsize, maxsize=db_pool_maxsize,
+                                                    pool_recycle=3600, connect_timeout=5)
+    return redis_client, mysql_pool
+
+
+async def close_db_pools():
+    global redis_pool, redis_client, mysql_pool
+    await stop_auth_key_listener()
+    if redis_client is not None:
+        await redis_client.close()
+        await redis_pool.disconnect()
+        redis_client, redis_pool = None, None
+    if mysql_pool is not None:
+        mysql_pool.close()
+        await mysql_pool.wait_closed()
+        mysql_pool = None
+
+
+async def get_redis():
+    if redis_client is None:
+        await init_db_pools()
+    return redis_client
+
+
+async def get_mysql():
+    if mysql_pool is None:
+        await init_db_pools()
+    return mysql_pool
+
+
+async def check_db_pools():
+    health = {}
+    try:
+        health["redis"] = await (await get_redis()).ping()
+    except Exception as e:
+        logger.error(f"Redis 健康检查失败: {e}")
+        health["redis"] = False
+    try:
+        async with (await get_mysql()).acquire() as conn:
+            await conn.ping(reconnect=True)
+        health["mysql"] = True
+    except Exception as e:
+        logger.error(f"MySQL 健康检查失败: {e}")
+        health["mysql"] = False
+    return health
+
+
+def get_db_pool_stats():
+    stats = {}
+    if redis_pool is not None:
+        stats["redis"] = {
+            "max_connections": redis_pool.max_connections,
+            "created": len(redis_pool._available_connections) + len(redis_pool._in_use_connections),
+            "in_use": len(redis_pool._in_use_connections),
+        }
+    if mysql_pool is not None:
+        stats["mysql"] = {
+            "minsize": mysql_pool.minsize,
+            "maxsize": mysql_pool.maxsize,
+            "size": mysql_pool.size,
+            "free": mysql_pool.freesize,
+            "in_use": mysql_pool.size - mysql_pool.freesize,
+        }
+    stats["local_cache"] = auth_key_local_cache.stats()
+    return stats
+
+
+# 从 Redis 读取缓存的 auth_key 信息及剩余过期时间
+async def get_cached_auth_key(auth_key):
+    redis_key = f"{AUTH_KEY_REDIS_PREFIX}{auth_key}"
+    async with (await get_redis()).pipeline(transaction=False) as pipe:
+        data_str, ttl = await pipe.get(redis_key).ttl(redis_key).execute()
+    return (json.loads(data_str) if data_str else None), ttl
+
+
+# 写入 Redis 缓存
+async def set_cached_auth_key(auth_key, data):
+    await (await get_redis()).set(f"{AUTH_KEY_REDIS_PREFIX}{auth_key}", json.dumps(data), ex=AUTH_KEY_CACHE_EXPIRE)
+    if data.get("rt_at_key"):
+        value = (data.get("rt_at_key"), data.get("type"), data.get("account_id"))
+        set_local_auth_key(auth_key, value, AUTH_KEY_CACHE_EXPIRE)
+
+
+def set_local_auth_key(auth_key, value, redis_ttl=None):
+    ttl = auth_key_local_ttl if value is not None else auth_key_negative_ttl
+    if redis_ttl is not None and redis_ttl > 0:
+        ttl = min(ttl, redis_ttl)
+    auth_key_local_cache.set(auth_key, value, ttl=ttl)
+
+
+# 删除本地与 Redis 中的缓存
+async def invalidate_auth_key(auth_key):
+    auth_key_local_cache.pop(auth_key)
+    await (await get_redis()).delete(f"{AUTH_KEY_REDIS_PREFIX}{auth_key}")
+
+
+# 广播 auth_key 失效；refresh 为 True 时先从 MySQL 重新加载写入 Redis，否则删除 Redis 缓存
+async def publish_auth_key_invalidation(auth_key, refresh=False):
+    if refresh:
+        await fill_auth_key(auth_key)
+    else:
+        await invalidate_auth_key(auth_key)
+    message = json.dumps({"auth_key": auth_key, "refresh": refresh})
+    return await (await get_redis()).publish(AUTH_KEY_INVALIDATE_CHANNEL, message)
+
+
+async def handle_auth_key_invalidation(message):
+    try:
+        data = json.loads(message)
+        auth_key = data["auth_key"]
+    except Exception as e:
+        logger.warning(f"无效的 auth_key 失效消息: {message}, {e}")
+        return
+    auth_key_local_cache.pop(auth_key)
+    logger.info(f"收到 auth_key 失效通知: {auth_key}, refresh: {data.get('refresh', False)}")
+    if auth_key in auth_key_inflight:
+        # 正在加载的旧数据可能已过期，等其结束后丢弃
+        auth_key_inflight[auth_key].add_done_callback(lambda _: auth_key_local_cache.pop(auth_key))
+
+
+async def auth_key_listener():
+    while True:
+        pubsub = None
+        try:
+            pubsub = (await get_redis()).pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(AUTH_KEY_INVALIDATE_CHANNEL)
+            # 断线期间可能漏掉通知，重新订阅后清空本地缓存
+            auth_key_local_cache.clear()
+            logger.info(f"已订阅 auth_key 失效频道: {AUTH_KEY_INVALIDATE_CHANNEL}")
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    data = message["data"]
+                    await handle_auth_key_invalidation(data.decode() if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"auth_key 失效频道订阅中断: {e}")
+            await asyncio.sleep(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def start_auth_key_listener():
+    global auth_key_listener_task
+    if auth_key_listener_task is None or auth_key_listener_task.done():
+        auth_key_listener_task = asyncio.create_task(auth_key_listener())
+    return auth_key_listener_task
+
+
+async def stop_auth_key_listener():
+    global auth_key_listener_task
+    if auth_key_listener_task is not None:
+        auth_key_listener_task.cancel()
+        try:
+            await auth_key_listener_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        auth_key_listener_task = None
+
+
+# 从 MySQL 查询 auth_key
+async def fetch_auth_key(auth_key):
+    async with (await get_mysql()).acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT rt_at_key, type, account_id FROM chat2api.auth_keys WHERE auth_key = %s", (auth_key,))
+            return await cur.fetchone()
+
+
+# 将 refresh_token 转换为 access_token
+async def convert_rt_at_key(rt_at_key):
+    rt_at_key_list = rt_at_key.split(",")
+    # 所有 refresh_token 并发转换
+    refresh_tokens = [item for item in rt_at_key_list if len(item) < 100]
+    access_tokens = dict(zip(refresh_tokens, await get_aks(refresh_tokens)))
+    access_token_list = []
+    for rt_at_key_item in rt_at_key_list:
+        access_token = access_tokens.get(rt_at_key_item, rt_at_key_item)
+        if access_token is not None:
+            access_token_list.append(access_token)
+        else:
+            logger.warning(f"get_ak 返回 None for key: {rt_at_key_item}")
+    # 如果 rt_at_key 是以 "," 分割的列表则进行处理
+    if "," in rt_at_key:
+        return ",".join(access_token_list)
+    return access_token_list[0] if access_token_list else None
+
+
+def single_flight(key, func):
+    task = auth_key_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(func())
+        auth_key_inflight[key] = task
+
+        def done(t):
+            auth_key_inflight.pop(key, None)
+            if not t.cancelled() and t.exception():
+                logger.error(f"加载 auth_key 失败: {t.exception()}")
+
+        task.add_done_callback(done)
+    return asyncio.shield(task)
+
+
+# 概率提前刷新：剩余时间越短、加载越慢，越可能在过期前刷新
+def should_refresh_early(ttl, delta):
+    if ttl is None or ttl < 0:
+        return False
+    return ttl - auth_key_local_ttl <= delta * auth_key_early_refresh_beta * -math.log(1 - random.random())
+
 
 # 获取 rt_at_key 列表
 async def get_rt_at_key_list(auth_key):
-    redis_key = f"{AUTH_KEY_REDIS_PREFIX}{auth_key}"
-    redis_pool = await redis.Redis(**REDIS_CONFIG)
+    # 先查进程内缓存
+    cached = auth_key_local_cache.get(auth_key)
+    if cached is not MISSING:
+        return cached if cached is not None else (None, None, None)
+    return await single_flight(auth_key, lambda: load_auth_key(auth_key))
+
+
+async def load_auth_key(auth_key):
     # 尝试从 Redis 获取缓存
-    data_str = await redis_pool.get(redis_key)
-    if data_str:
-        data = json.loads(data_str)
-        rt_at_key = data.get("rt_at_key")
-        type = data.get("type")
-        account_id = data.get("account_id")
-        if rt_at_key:
-            logger.info(f"从 Redis 获取到 rt_at_key: {rt_at_key} type: {type} account_id: {account_id} for auth_key: {auth_key}")
-            return rt_at_key, type, account_id
-    else:
-        # Redis 中没有缓存，从 MySQL 获取
-        mysql_pool = await aiomysql.create_pool(**DB_CONFIG)
-        async with mysql_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT rt_at_key, type, account_id FROM chat2api.auth_keys WHERE auth_key = %s", (auth_key,))
-                result = await cur.fetchone()
-                if result:
-                    rt_at_key, type, account_id = result
-                    account_id = account_id if account_id else None
-                    logger.info(f"从 MySQL 获取到 rt_at_key: {rt_at_key} type: {type} account_id: {account_id} for auth_key: {auth_key}")
-                else:
-                    await mysql_pool.close() # 关闭 MySQL 连接
-                    return None, None, None
-
-        if rt_at_key:
-            # 如果 rt_at_key 是以 "," 分割的列表则进行处理
-            if "," in rt_at_key:
-                rt_at_key_list = rt_at_key.split(",")
-                access_token_list = []
-                for rt_at_key_item in rt_at_key_list:
-                    if len(rt_at_key_item) < 100:
-                        access_token = await get_ak(rt_at_key_item)
-                        if access_token is not None:
-                            access_token_list.append(access_token)
-                        else:
-                            logger.warning(f"get_ak 返回 None for key: {rt_at_key_item}")
-                    else:
-                        access_token_list.append(rt_at_key_item)
-                # 过滤掉任何可能的 None 值
-                access_token_list = [token for token in access_token_list if token is not None]
-                rt_at_key = ",".join(access_token_list)
-            else:
-                if len(rt_at_key) < 100:
-                    rt_at_key = await get_ak(rt_at_key)
-                    if rt_at_key is None:
-                        logger.warning(f"get_ak 返回 None for key: {rt_at_key}")
-                # 这里也需要检查 rt_at_key 是否为 None
-            data = {
-                "rt_at_key": rt_at_key,
-                "type": type,
-                "account_id": account_id
-            }
-            await redis_pool.set(redis_key, json.dumps(data), ex=AUTH_KEY_CACHE_EXPIRE)
-            logger.info(f"将 rt_at_key 存入 Redis: {json.dumps(data)} for auth_key: {auth_key}")
-            await redis_pool.close()  # 关闭 Redis 连接
-            await mysql_pool.close() # 关闭 MySQL 连接
-            return rt_at_key, type, account_id
\ No newline at end of file
+    data, ttl = await get_cached_auth_key(auth_key)
+    if data and data.get("rt_at_key"):
+        rt_at_key, type, account_id = data.get("rt_at_key"), data.get("type"), data.get("account_id")
+        logger.info(f"从 Redis 获取到 rt_at_key: {rt_at_key} type: {type} account_id: {account_id} for auth_key: {auth_key}")
+        set_local_auth_key(auth_key, (rt_at_key, type, account_id), ttl)
+        if should_refresh_early(ttl, data.get("delta", 1)):
+            logger.info(f"提前刷新 auth_key: {auth_key}, 剩余 {ttl} 秒")
+            task = asyncio.create_task(refresh_auth_key(auth_key))
+            auth_key_refresh_tasks.add(task)
+            task.add_done_callback(auth_key_refresh_tasks.discard)
+        return rt_at_key, type, account_id
+    return await fill_auth_key(auth_key)
+
+
+async def refresh_auth_key(auth_key):
+    try:
+        await single_flight(f"refresh:{auth_key}", lambda: fill_auth_key(auth_key))
+    except Exception as e:
+        logger.error(f"提前刷新 auth_key 失败: {auth_key}, {e}")
+
+
+# 从 MySQL 获取并转换，写入缓存
+async def fill_auth_key(auth_key):
+    start = time.time()
+    result = await fetch_auth_key(auth_key)
+    if not result or not result[0]:
+        set_local_auth_key(auth_key, None)
+        return None, None, None
+    rt_at_key, type, account_id = result
+    account_id = account_id if account_id else None
+    logger.info(f"从 MySQL 获取到 rt_at_key: {rt_at_key} type: {type} account_id: {account_id} for auth_key: {auth_key}")
+
+    rt_at_key = await convert_rt_at_key(rt_at_key)
+    data = {
+        "rt_at_key": rt_at_key,
+        "type": type,
+        "account_id": account_id,
+        "delta": round(time.time() - start, 3)
+    }
+    await set_cached_auth_key(auth_key, data)
+    logger.info(f"将 rt_at_key 存入 Redis: {json.dumps(data)} for auth_key: {auth_key}")
+    return rt_at_key, type, account_id
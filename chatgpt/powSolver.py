@@ -0,0 +1,207 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chatgpt.proofofWork import generate_answer, fallback_answer, expected_iterations
+from utils.Logger import logger
+from utils.config import pow_workers, pow_chunk_size, pow_deadline
+
+POW_MAX_ITERATIONS = 500000
+
+
+def solve_range(seed, diff, config, start, end):
+    begin = time.perf_counter()
+    answer, solved = generate_answer(seed, diff, config, start, end)
+    return answer, solved, time.perf_counter() - begin
+
+
+# 用一个不可能命中的难度测量单核每秒迭代次数
+def measure_rate(iterations=2000):
+    _, _, elapsed = solve_range("0", "000000", [0] * 15, 0, iterations)
+    return iterations / max(elapsed, 1e-6)
+
+
+class PowSolver:
+    def __init__(self, workers=pow_workers, chunk_size=pow_chunk_size, deadline=pow_deadline,
+                 max_iterations=POW_MAX_ITERATIONS, alpha=0.2):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.deadline = deadline
+        self.max_iterations = max_iterations
+        self.alpha = alpha
+        self.executor = None
+        self.started = False
+        self.rate = None
+        self.solving = 0
+        self.pending_chunks = 0
+        self.solved = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.solve_time = None
+        self.max_solve_time = 0
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self.rate = measure_rate()
+        if self.workers <= 0:
+            return
+        # app.py 在模块级启动 uvicorn，spawn/forkserver 会在子进程中重新执行它，只能使用 fork
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.warning("PoW solver pool requires fork, falling back to threads")
+            self.workers = 0
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        for _ in range(self.workers):
+            self.executor.submit(measure_rate)
+        logger.info(f"PoW solver pool started with {self.workers} workers, {int(self.rate)} it/s per worker")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.started = False
+
+    # 其他 CPU 密集的求解（如 turnstile）复用同一个进程池
+    async def run(self, func, *args):
+        if not self.started:
+            self.start()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def update_rate(self, iterations, elapsed):
+        if elapsed > 0:
+            rate = iterations / elapsed
+            self.rate = rate if self.rate is None else self.rate + self.alpha * (rate - self.rate)
+
+    def estimate(self, diff):
+        if not self.started:
+            self.start()
+        # 新的求解与正在进行的求解平分所有 worker
+        throughput = self.rate * max(self.workers, 1) / (self.solving + 1)
+        return expected_iterations(diff) / throughput
+
+    def admit(self, diff):
+        if self.deadline <= 0:
+            return True
+        estimate = self.estimate(diff)
+        if estimate > self.deadline:
+            self.rejected += 1
+            logger.info(f"Reject proof of work diff: {diff}, estimate: {int(estimate * 1000)}ms")
+            return False
+        return True
+
+    async def solve(self, seed, diff, config):
+        if not self.started:
+            self.start()
+        start = time.time()
+        self.solving += 1
+        try:
+            answer, solved = await self.solve_chunks(seed, diff, config)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.solving -= 1
+        elapsed = time.time() - start
+        self.solve_time = elapsed if self.solve_time is None else self.solve_time + self.alpha * (elapsed - self.solve_time)
+        self.max_solve_time = max(self.max_solve_time, elapsed)
+        if solved:
+            self.solved += 1
+        else:
+            self.failed += 1
+        logger.info(f'diff: {diff}, time: {int(elapsed * 1e6) / 1e3}ms, solved: {solved}')
+        return "gAAAAAB" + answer, solved
+
+    async def solve_chunks(self, seed, diff, config):
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + self.deadline if self.deadline > 0 else None
+        parallel = max(self.workers, 1)
+        chunk_starts = {}
+        pending = set()
+        next_start = 0
+        best = None
+        try:
+            while True:
+                # 按顺序分发区间，找到解后只等待更靠前的区间，保证结果与单线程一致
+                while best is None and len(pending) < parallel and next_start < self.max_iterations:
+                    end = min(next_start + self.chunk_size, self.max_iterations)
+                    future = loop.run_in_executor(self.executor, solve_range, seed, diff, config, next_start, end)
+                    chunk_starts[future] = next_start
+                    pending.add(future)
+                    self.pending_chunks += 1
+                    next_start = end
+                if not pending:
+                    break
+                timeout = max(deadline - time.time(), 0) if deadline else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.timeouts += 1
+                    logger.info(f"Proof of work diff: {diff} exceeded {self.deadline}s deadline at nonce {next_start}")
+                    return fallback_answer(seed), False
+                self.pending_chunks -= len(done)
+                for future in done:
+                    answer, solved, elapsed = future.result()
+                    if solved:
+                        if best is None or chunk_starts[future] < best[0]:
+                            best = (chunk_starts[future], answer)
+                    else:
+                        self.update_rate(min(self.chunk_size, self.max_iterations - chunk_starts[future]), elapsed)
+                if best is not None:
+                    for future in [f for f in pending if chunk_starts[f] > best[0]]:
+                        future.cancel()
+                        pending.discard(future)
+                        self.pending_chunks -= 1
+        finally:
+            for future in pending:
+                future.cancel()
+            self.pending_chunks -= len(pending)
+        if best is None:
+            return fallback_answer(seed), False
+        return best[1], True
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "rate": int(self.rate) if self.rate else None,
+            "deadline": self.deadline,
+            "solving": self.solving,
+            "pending_chunks": self.pending_chunks,
+            "solved": self.solved,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "solve_time_ms": round(self.solve_time * 1000, 1) if self.solve_time is not None else None,
+            "max_solve_time_ms": round(self.max_solve_time * 1000, 1),
+        }
+
+
+pow_solver = PowSolver()
+
+
+if __name__ == "__main__":
+    import random
+
+    from chatgpt.proofofWork import get_config, get_answer_token
+
+    async def main():
+        config = get_config("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36")
+        seeds = [format(random.random()) for _ in range(8)]
+        diff = "0001ff"
+        start = time.time()
+        expected = [get_answer_token(seed, diff, config) for seed in seeds]
+        print(f"single thread: {time.time() - start:.2f}s")
+        pow_solver.start()
+        for d in ["00ffff", diff, "000032", "000001"]:
+            print(f"diff {d}: estimate {pow_solver.estimate(d) * 1000:.1f}ms, admit: {pow_solver.admit(d)}")
+        start = time.time()
+        results = await asyncio.gather(*[pow_solver.solve(seed, diff, config) for seed in seeds])
+        print(f"pool ({pow_solver.workers} workers): {time.time() - start:.2f}s, identical: {results == expected}")
+        print(pow_solver.stats())
+        pow_solver.shutdown()
+
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import json
 import random
@@ -9,17 +10,26 @@ from html.parser import HTMLParser
 
 import pybase64
 
+from utils.Client import Client
 from utils.Logger import logger
-from utils.config import conversation_only
+from utils.balancer import proxy_balancer, backend_router
+from utils.cache import TTLCache, MISSING
+from utils.config import conversation_only, dpl_refresh_interval
 
 cores = [16, 24, 32]
 screens = [3000, 4000, 6000]
 timeLayout = "%a %b %d %Y %H:%M:%S"
+DPL_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0"
 
 cached_scripts = []
 cached_dpl = ""
 cached_time = 0
 cached_require_proof = ""
+dpl_version = 0
+
+# 每个 UA 的指纹在 dpl 不变时保持稳定，只替换时间、perf_counter 和 uuid
+fingerprint_profiles = TTLCache(max_size=1000, ttl=30 * 60)
+cached_parse_time = (0, "")
 
 navigator_key = [
     "registerProtocolHandler−function registerProtocolHandler() { [native code] }",
@@ -381,84 +391,136 @@ window_key = [
 
 
 class ScriptSrcParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.scripts = []
+        self.dpl = ""
+
     def handle_starttag(self, tag, attrs):
-        global cached_scripts, cached_dpl, cached_time
         if tag == "script":
             attrs_dict = dict(attrs)
             if "src" in attrs_dict:
                 src = attrs_dict["src"]
-                cached_scripts.append(src)
+                self.scripts.append(src)
                 match = re.search(r"c/[^/]*/_", src)
                 if match:
-                    cached_dpl = match.group(0)
-                    cached_time = int(time.time())
+                    self.dpl = match.group(0)
 
 
 def get_data_build_from_html(html_content):
-    global cached_scripts, cached_dpl, cached_time
     parser = ScriptSrcParser()
     parser.feed(html_content)
-    if not cached_scripts:
-        cached_scripts.append("https://chatgpt.com/backend-api/sentinel/sdk.js")
-    if not cached_dpl:
+    scripts, dpl = parser.scripts, parser.dpl
+    if not scripts:
+        scripts.append("https://chatgpt.com/backend-api/sentinel/sdk.js")
+    if not dpl:
         match = re.search(r'<html[^>]*data-build="([^"]*)"', html_content)
         if match:
-            data_build = match.group(1)
-            cached_dpl = data_build
-            cached_time = int(time.time())
-            logger.info(f"Found dpl: {cached_dpl}")
-
-
-async def get_dpl(service):
-    global cached_scripts, cached_dpl, cached_time
-    if int(time.time()) - cached_time < 15 * 60:
-        return True
-    headers = service.base_headers.copy()
-    cached_scripts = []
-    cached_dpl = ""
+            dpl = match.group(1)
+    return scripts, dpl
+
+
+async def refresh_dpl():
+    global cached_scripts, cached_dpl, cached_time, dpl_version
+    host_url = backend_router.choose() or "https://chatgpt.com"
+    client = Client(proxy=proxy_balancer.choose(), impersonate="edge101")
+    headers = {
+        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "accept-language": "en-US,en;q=0.9",
+        "user-agent": DPL_USER_AGENT,
+    }
     try:
-        if conversation_only:
-            return True
-        r = await service.s.get(f"{service.host_url}/", headers=headers, timeout=5)
+        with backend_router.track(host_url) as probe:
+            r = await client.get(f"{host_url}/", headers=headers, timeout=10)
+            probe.done(r.status_code, spinner=r.status_code != 200 and "cf-spinner-please-wait" in r.text)
         r.raise_for_status()
-        get_data_build_from_html(r.text)
-        if not cached_dpl:
+        scripts, dpl = get_data_build_from_html(r.text)
+        if not dpl:
             raise Exception("No Cached DPL")
-        else:
-            return True
     except Exception as e:
-        logger.info(f"Failed to get dpl: {e}")
-        cached_dpl = None
-        cached_time = int(time.time())
+        logger.info(f"Failed to get dpl, keep {cached_dpl or None}: {e}")
         return False
+    finally:
+        await client.close()
+    if (scripts, dpl) != (cached_scripts, cached_dpl):
+        # 整体替换，读取方看不到清空或解析到一半的列表；预先生成的 requirements token 随之作废
+        cached_scripts, cached_dpl = scripts, dpl
+        dpl_version += 1
+        logger.info(f"Found dpl: {cached_dpl}")
+    cached_time = int(time.time())
+    return True
+
+
+async def keep_dpl_fresh():
+    while True:
+        try:
+            ok = await refresh_dpl()
+        except Exception as e:
+            logger.error(f"Failed to refresh dpl: {e}")
+            ok = False
+        await asyncio.sleep(dpl_refresh_interval if ok else min(60, dpl_refresh_interval))
+
+
+async def start_dpl_refresher():
+    if conversation_only:
+        return None
+    try:
+        await asyncio.wait_for(refresh_dpl(), timeout=15)
+    except asyncio.TimeoutError:
+        logger.warning("Initial dpl refresh timed out")
+    return asyncio.create_task(keep_dpl_fresh())
 
 
 def get_parse_time():
-    now = datetime.now(timezone(timedelta(hours=-5)))
-    return now.strftime(timeLayout) + " GMT-0500 (Eastern Standard Time)"
+    global cached_parse_time
+    second = int(time.time())
+    if cached_parse_time[0] != second:
+        now = datetime.fromtimestamp(second, timezone(timedelta(hours=-5)))
+        cached_parse_time = (second, now.strftime(timeLayout) + " GMT-0500 (Eastern Standard Time)")
+    return cached_parse_time[1]
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+# 携带预先序列化好的 generate_answer 静态片段，可以被 pickle 到求解进程
+class FingerprintConfig(list):
+    parts = None
+
+
+class FingerprintProfile:
+    def __init__(self, user_agent):
+        self.core_screen = random.choice(cores) + random.choice(screens)
+        self.script = random.choice(cached_scripts) if cached_scripts else None
+        self.dpl = cached_dpl
+        self.keys = [random.choice(navigator_key), random.choice(document_key), random.choice(window_key)]
+        self.head = [self.core_screen]
+        self.middle = [4294705152, 0, user_agent, self.script, self.dpl, "en-US", "en-US,es-US,en,es", 0]
+        self.part1_prefix = '[' + dumps(self.core_screen) + ','
+        self.part2 = (',' + dumps(self.middle[2:7])[1:-1] + ',').encode()
+        self.part3_prefix = ',' + dumps(self.keys)[1:-1] + ','
+
+    def build(self):
+        parse_time = get_parse_time()
+        perf_counter = time.perf_counter()
+        device_uuid = str(uuid.uuid4())
+        config = FingerprintConfig(self.head + [parse_time] + self.middle + self.keys + [perf_counter, device_uuid])
+        config.parts = (
+            (self.part1_prefix + dumps(parse_time) + ',4294705152,').encode(),
+            self.part2,
+            (self.part3_prefix + dumps(perf_counter) + ',' + dumps(device_uuid) + ']').encode(),
+        )
+        return config
 
 
 def get_config(user_agent):
-    core = random.choice(cores)
-    screen = random.choice(screens)
-    config = [
-        core + screen,
-        get_parse_time(),
-        4294705152,
-        0,
-        user_agent,
-        random.choice(cached_scripts) if cached_scripts else None,
-        cached_dpl,
-        "en-US",
-        "en-US,es-US,en,es",
-        0,
-        random.choice(navigator_key),
-        random.choice(document_key),
-        random.choice(window_key),
-        time.perf_counter(),
-        str(uuid.uuid4()),
-    ]
-    return config
+    key = (user_agent, dpl_version)
+    profile = fingerprint_profiles.get(key)
+    if profile is MISSING:
+        profile = FingerprintProfile(user_agent)
+        fingerprint_profiles.set(key, profile)
+    return profile.build()
 
 
 def get_answer_token(seed, diff, config):
@@ -469,25 +531,42 @@ def get_answer_token(seed, diff, config):
     return "gAAAAAB" + answer, solved
 
 
-def generate_answer(seed, diff, config):
+def generate_answer(seed, diff, config, start=0, end=500000):
     diff_len = len(diff)
     seed_encoded = seed.encode()
-    static_config_part1 = (json.dumps(config[:3], separators=(',', ':'), ensure_ascii=False)[:-1] + ',').encode()
-    static_config_part2 = (',' + json.dumps(config[4:9], separators=(',', ':'), ensure_ascii=False)[1:-1] + ',').encode()
-    static_config_part3 = (',' + json.dumps(config[10:], separators=(',', ':'), ensure_ascii=False)[1:]).encode()
+    if getattr(config, "parts", None):
+        static_config_part1, static_config_part2, static_config_part3 = config.parts
+    else:
+        static_config_part1 = (json.dumps(config[:3], separators=(',', ':'), ensure_ascii=False)[:-1] + ',').encode()
+        static_config_part2 = (',' + json.dumps(config[4:9], separators=(',', ':'), ensure_ascii=False)[1:-1] + ',').encode()
+        static_config_part3 = (',' + json.dumps(config[10:], separators=(',', ':'), ensure_ascii=False)[1:]).encode()
 
     target_diff = bytes.fromhex(diff)
 
-    for i in range(500000):
-        dynamic_json_i = str(i).encode()
-        dynamic_json_j = str(i >> 1).encode()
-        final_json_bytes = static_config_part1 + dynamic_json_i + static_config_part2 + dynamic_json_j + static_config_part3
-        base_encode = pybase64.b64encode(final_json_bytes)
-        hash_value = hashlib.sha3_512(seed_encoded + base_encode).digest()
-        if hash_value[:diff_len] <= target_diff:
-            return base_encode.decode(), True
+    # 前缀中完整的 3 字节分组编码后不随 nonce 变化，预先计算其 base64 和哈希状态
+    prefix_len = len(static_config_part1) // 3 * 3
+    prefix_encode = pybase64.b64encode(static_config_part1[:prefix_len])
+    static_tail = static_config_part1[prefix_len:]
+    prefix_hash = hashlib.sha3_512(seed_encoded + prefix_encode)
+    b64encode = pybase64.b64encode
+
+    for i in range(start, end):
+        tail_encode = b64encode(b"%s%d%s%d%s" % (static_tail, i, static_config_part2, i >> 1, static_config_part3))
+        hasher = prefix_hash.copy()
+        hasher.update(tail_encode)
+        if hasher.digest()[:diff_len] <= target_diff:
+            return (prefix_encode + tail_encode).decode(), True
+
+    return fallback_answer(seed), False
 
-    return "wQ8Lk5FbGpA2NcR9dShT6gYjU7VxZ4D" + pybase64.b64encode(f'"{seed}"'.encode()).decode(), False
+
+# 哈希前 len(diff) 字节与 diff 的字节串比较，长度更长时相等前缀也判为更大，因此命中概率为 int(diff) / 256^n
+def expected_iterations(diff):
+    return 256 ** (len(diff) // 2) / max(int(diff, 16), 1)
+
+
+def fallback_answer(seed):
+    return "wQ8Lk5FbGpA2NcR9dShT6gYjU7VxZ4D" + pybase64.b64encode(f'"{seed}"'.encode()).decode()
 
 
 def get_requirements_token(config):
@@ -496,17 +575,41 @@ def get_requirements_token(config):
 
 
 if __name__ == "__main__":
-    # cached_scripts.append(
-    #     "https://cdn.oaistatic.com/_next/static/cXh69klOLzS0Gy2joLDRS/_ssgManifest.js?dpl=453ebaec0d44c2decab71692e1bfe39be35a24b3")
-    # cached_dpl = "453ebaec0d44c2decab71692e1bfe39be35a24b3"
-    # cached_time = int(time.time())
-    # for i in range(10):
-    #     seed = format(random.random())
-    #     diff = "000032"
-    #     config = get_config("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome")
-    #     answer = get_answer_token(seed, diff, config)
+    from utils.config import pow_difficulty
+
+    def generate_answer_reference(seed, diff, config, start=0, end=500000):
+        diff_len = len(diff)
+        seed_encoded = seed.encode()
+        static_config_part1 = (json.dumps(config[:3], separators=(',', ':'), ensure_ascii=False)[:-1] + ',').encode()
+        static_config_part2 = (',' + json.dumps(config[4:9], separators=(',', ':'), ensure_ascii=False)[1:-1] + ',').encode()
+        static_config_part3 = (',' + json.dumps(config[10:], separators=(',', ':'), ensure_ascii=False)[1:]).encode()
+        target_diff = bytes.fromhex(diff)
+        for i in range(start, end):
+            final_json_bytes = static_config_part1 + str(i).encode() + static_config_part2 + str(i >> 1).encode() + static_config_part3
+            base_encode = pybase64.b64encode(final_json_bytes)
+            hash_value = hashlib.sha3_512(seed_encoded + base_encode).digest()
+            if hash_value[:diff_len] <= target_diff:
+                return base_encode.decode(), True
+        return fallback_answer(seed), False
+
     cached_scripts.append(
         "https://cdn.oaistatic.com/_next/static/cXh69klOLzS0Gy2joLDRS/_ssgManifest.js?dpl=453ebaec0d44c2decab71692e1bfe39be35a24b3")
     cached_dpl = "dpl=453ebaec0d44c2decab71692e1bfe39be35a24b3"
     config = get_config("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36")
     get_requirements_token(config)
+
+    iterations = 100000
+    seeds = [format(random.random()) for _ in range(20)]
+    for diff in ["0fffff", "00ffff", "000fff", pow_difficulty]:
+        for seed in seeds:
+            assert generate_answer(seed, diff, config, 0, 20000) == generate_answer_reference(seed, diff, config, 0, 20000)
+    rates = []
+    for solver in (generate_answer_reference, generate_answer):
+        start = time.perf_counter()
+        solver(seeds[0], "000000", config, 0, iterations)
+        rates.append(iterations / (time.perf_counter() - start))
+    print(f"reference {rates[0]:,.0f} it/s, incremental {rates[1]:,.0f} it/s, {rates[1] / rates[0]:.2f}x")
+    for diff in ["0fffff", "00ffff", "000fff", pow_difficulty]:
+        expected = expected_iterations(diff)
+        print(f"diff {diff}: ~{expected:,.0f} iterations, reference {expected / rates[0] * 1000:.1f}ms, "
+              f"incremental {expected / rates[1] * 1000:.1f}ms")
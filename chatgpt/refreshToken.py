@@ -1,12 +1,11 @@
 import json
-import random
 import time
 
 from fastapi import HTTPException
 
 from utils.Client import Client
 from utils.Logger import logger
-from utils.config import proxy_url_list
+from utils.balancer import proxy_balancer
 import chatgpt.globals as globals
 
 
@@ -15,8 +14,12 @@ def save_refresh_map(refresh_map):
         json.dump(refresh_map, file)
 
 
-async def rt2ac(refresh_token, force_refresh=False):
-    if not force_refresh and (refresh_token in globals.refresh_map and int(time.time()) - globals.refresh_map.get(refresh_token, {}).get("timestamp", 0) < 5 * 24 * 60 * 60):
+def is_refresh_fresh(refresh_token):
+    return refresh_token in globals.refresh_map and int(time.time()) - globals.refresh_map.get(refresh_token, {}).get("timestamp", 0) < 5 * 24 * 60 * 60
+
+
+async def rt2ac(refresh_token, force_refresh=False, save=True):
+    if not force_refresh and is_refresh_fresh(refresh_token):
         access_token = globals.refresh_map[refresh_token]["token"]
         logger.info(f"refresh_token -> access_token from cache")
         return access_token
@@ -24,7 +27,8 @@ async def rt2ac(refresh_token, force_refresh=False):
         try:
             access_token = await chat_refresh(refresh_token)
             globals.refresh_map[refresh_token] = {"token": access_token, "timestamp": int(time.time())}
-            save_refresh_map(globals.refresh_map)
+            if save:
+                save_refresh_map(globals.refresh_map)
             logger.info(f"refresh_token -> access_token with openai: {access_token}")
             return access_token
         except HTTPException as e:
@@ -38,7 +42,7 @@ async def chat_refresh(refresh_token):
         "redirect_uri": "com.openai.chat://auth0.openai.com/ios/com.openai.chat/callback",
         "refresh_token": refresh_token
     }
-    client = Client(proxy=random.choice(proxy_url_list) if proxy_url_list else None)
+    client = Client(proxy=proxy_balancer.choose())
     try:
         r = await client.post("https://auth0.openai.com/oauth/token", json=data, timeout=5)
         if r.status_code == 200:
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from collections import deque
+
+import chatgpt.proofofWork as proofofWork
+from chatgpt.proofofWork import get_config, get_requirements_token
+from utils.cache import TTLCache, MISSING
+from utils.Logger import logger
+from utils.config import requirements_reservoir_size
+
+# 预生成的 token 携带 config 中的时间，超过该秒数后不再使用
+REQUIREMENTS_TOKEN_TTL = 120
+
+
+class RequirementsReservoir:
+    def __init__(self, size=requirements_reservoir_size, ttl=REQUIREMENTS_TOKEN_TTL, max_profiles=1000):
+        self.size = size
+        self.ttl = ttl
+        self.profiles = TTLCache(max_size=max_profiles, ttl=10 * 60)
+        self.refilling = {}
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def get(self, user_agent):
+        tokens = self.profiles.get(user_agent)
+        if tokens is not MISSING:
+            self.profiles.set(user_agent, tokens)
+            now = time.time()
+            while tokens:
+                created, version, config, token = tokens.popleft()
+                if version == proofofWork.dpl_version and now - created < self.ttl:
+                    self.hits += 1
+                    self.refill(user_agent)
+                    return config, token
+                self.discarded += 1
+        self.misses += 1
+        self.refill(user_agent)
+        config = get_config(user_agent)
+        return config, get_requirements_token(config)
+
+    def refill(self, user_agent):
+        if self.size <= 0 or user_agent in self.refilling:
+            return
+        task = asyncio.create_task(self.fill(user_agent))
+        self.refilling[user_agent] = task
+        task.add_done_callback(lambda _: self.refilling.pop(user_agent, None))
+
+    async def fill(self, user_agent):
+        tokens = self.profiles.get(user_agent)
+        if tokens is MISSING:
+            tokens = deque()
+            self.profiles.set(user_agent, tokens)
+        try:
+            while len(tokens) < self.size:
+                version = proofofWork.dpl_version
+                config = get_config(user_agent)
+                token = get_requirements_token(config)
+                if version == proofofWork.dpl_version:
+                    tokens.append((time.time(), version, config, token))
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"Failed to fill requirements tokens: {e}")
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "profiles": len(self.profiles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+        }
+
+
+requirements_reservoir = RequirementsReservoir()
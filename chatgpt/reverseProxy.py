@@ -1,5 +1,4 @@
 import json
-import random
 
 from fastapi import Request, HTTPException
 from fastapi.responses import StreamingResponse, Response
@@ -7,7 +6,8 @@ from starlette.background import BackgroundTask
 
 from chatgpt.authorization import verify_token, get_req_token, get_ua
 from utils.Client import Client
-from utils.config import chatgpt_base_url_list, proxy_url_list, enable_gateway
+from utils.balancer import proxy_balancer, backend_router
+from utils.config import enable_gateway
 
 headers_reject_list = [
     "x-real-ip",
@@ -91,7 +91,7 @@ async def chatgpt_reverse_proxy(request: Request, path: str):
             if (key.lower() not in ["host", "origin", "referer", "priority", "oai-device-id"] and key.lower() not in headers_reject_list)
         }
 
-        base_url = random.choice(chatgpt_base_url_list) if chatgpt_base_url_list else "https://chatgpt.com"
+        base_url = backend_router.choose() or "https://chatgpt.com"
         if "assets/" in path:
             base_url = "https://cdn.oaistatic.com"
         if "file-" in path and "backend-api" not in path:
@@ -117,11 +117,13 @@ async def chatgpt_reverse_proxy(request: Request, path: str):
 
         data = await request.body()
 
-        client = Client(proxy=random.choice(proxy_url_list) if proxy_url_list else None)
+        client = Client(proxy=proxy_balancer.choose())
         try:
             background = BackgroundTask(client.close)
-            r = await client.request(request.method, f"{base_url}/{path}", params=params, headers=headers,
-                                     cookies=request_cookies, data=data, stream=True, allow_redirects=False)
+            with backend_router.track(base_url) as probe:
+                r = await client.request(request.method, f"{base_url}/{path}", params=params, headers=headers,
+                                         cookies=request_cookies, data=data, stream=True, allow_redirects=False)
+                probe.done(r.status_code)
 
             if r.status_code == 302:
                 return Response(status_code=302,
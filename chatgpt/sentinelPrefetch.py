@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from utils.cache import TTLCache, MISSING
+from utils.Logger import logger
+from utils.config import sentinel_prefetch_ttl, sentinel_prefetch_concurrency
+
+
+class SentinelPrefetch:
+    def __init__(self, ttl=sentinel_prefetch_ttl, concurrency=sentinel_prefetch_concurrency, max_size=10000):
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.entries = TTLCache(max_size=max_size, ttl=ttl)
+        self.seen = TTLCache(max_size=max_size, ttl=ttl)
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.skipped = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(service):
+        if not service.access_token:
+            return None
+        return service.access_token, service.account_id, service.user_agent
+
+    def pop(self, service):
+        key = self.key(service)
+        if self.ttl <= 0 or key is None:
+            return None
+        entry = self.entries.pop(key, MISSING)
+        if entry is MISSING or entry["expires_at"] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    # 只为 TTL 内再次出现的账号预取，轮换使用的账号大多不会在有效期内再次请求，预取只会浪费一次求解
+    def schedule(self, service):
+        key = self.key(service)
+        if self.ttl <= 0 or key is None:
+            return
+        seen = self.seen.get(key, None)
+        self.seen.set(key, True)
+        if seen is None or key in self.inflight or self.entries.get(key) is not MISSING:
+            return
+        if len(self.inflight) >= self.concurrency:
+            self.skipped += 1
+            return
+        task = asyncio.create_task(self.prefetch(key, service))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+    async def prefetch(self, key, service):
+        start = time.time()
+        try:
+            entry = await service.prefetch_chat_requirements()
+        except HTTPException as e:
+            self.errors += 1
+            logger.info(f"Prefetch chat requirements failed: {e.status_code}, {e.detail}")
+            return
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Prefetch chat requirements failed: {e}")
+            return
+        if entry is None:
+            self.skipped += 1
+            return
+        # 有效期从发出 sentinel 请求时开始计算
+        ttl = self.ttl - (time.time() - start)
+        if ttl > 0:
+            entry["expires_at"] = start + self.ttl
+            self.entries.set(key, entry, ttl=ttl)
+            self.prefetched += 1
+
+    def stats(self):
+        return {
+            "ttl": self.ttl,
+            "ready": len(self.entries),
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "prefetched": self.prefetched,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+sentinel_prefetch = SentinelPrefetch()
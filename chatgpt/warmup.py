@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import chatgpt.globals as globals
+from utils.Client import session_pool
+from utils.Logger import logger
+from utils.config import chatgpt_base_url_list, proxy_url_list, warmup_connections, warmup_interval, warmup_timeout
+
+AUTH0_URL = "https://auth0.openai.com"
+
+warmup_status = {"ready": False, "targets": 0, "connections": 0, "last_warmup": 0}
+warmup_task = None
+
+
+def get_warmup_targets():
+    base_url_list = chatgpt_base_url_list or ["https://chatgpt.com"]
+    proxies = proxy_url_list or [None]
+    impersonates = {ua.get("impersonate") for ua in globals.user_agent_map.values() if ua.get("impersonate")}
+    impersonates = impersonates or set(globals.impersonate_list)
+    targets = []
+    for proxy in proxies:
+        for base_url in base_url_list:
+            for impersonate in impersonates:
+                targets.append((f"{base_url}/", proxy, impersonate))
+        targets.append((f"{AUTH0_URL}/", proxy, "safari15_3"))
+    return targets
+
+
+# 只保持最近实际使用过的会话的连接，空闲超过 SESSION_IDLE_TIMEOUT 的会话被回收后不再预热
+def get_keep_warm_targets():
+    base_url_list = chatgpt_base_url_list or ["https://chatgpt.com"]
+    targets = []
+    for proxy, impersonate, verify in session_pool.recent():
+        if not verify:
+            continue
+        for base_url in base_url_list:
+            targets.append((f"{base_url}/", proxy, impersonate))
+    return targets
+
+
+async def warmup_upstreams(targets, connections=warmup_connections):
+    start = time.time()
+    results = await asyncio.gather(
+        *[session_pool.warmup(url, proxy, impersonate, connections=connections) for url, proxy, impersonate in targets]
+    )
+    warmup_status.update({"targets": len(targets), "connections": sum(results), "last_warmup": int(time.time())})
+    logger.info(f"Warm-up {sum(results)} connections to {len(targets)} upstreams in {int((time.time() - start) * 1000)}ms")
+
+
+# 在后台预热，不阻塞启动，预热完成前 /ready 返回 503
+def start_warmup():
+    global warmup_task
+    if warmup_connections <= 0:
+        warmup_status["ready"] = True
+        return None
+    warmup_task = asyncio.create_task(keep_warm())
+    return warmup_task
+
+
+async def keep_warm():
+    try:
+        await asyncio.wait_for(warmup_upstreams(get_warmup_targets()), timeout=warmup_timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up did not finish in {warmup_timeout}s")
+    except Exception as e:
+        logger.error(f"Failed to warm up upstream connections: {e}")
+    warmup_status["ready"] = True
+    while True:
+        await asyncio.sleep(warmup_interval)
+        try:
+            await warmup_upstreams(get_keep_warm_targets())
+        except Exception as e:
+            logger.error(f"Failed to keep upstream connections warm: {e}")
@@ -0,0 +1,101 @@
+import asyncio
+
+from utils.Client import Client, session_pool
+from utils.balancer import Backend, BackendRouter, CircuitBreaker
+
+
+async def stand_in_upstream(reader, writer, status, delay):
+    await reader.readuntil(b"\r\n\r\n")
+    await asyncio.sleep(delay)
+    writer.write(f"HTTP/1.1 {status} X\r\ncontent-type: text/event-stream\r\ncontent-length: 14\r\n\r\n".encode())
+    writer.write(b"data: [DONE]\n\n")
+    await writer.drain()
+    writer.close()
+
+
+async def route_through_stand_ins(requests=200):
+    upstreams = {"fast": (200, 0.01), "slow": (200, 0.2), "broken": (502, 0)}
+    router = BackendRouter([])
+    servers = []
+    urls = {}
+    for name, (status, delay) in upstreams.items():
+        server = await asyncio.start_server(
+            lambda r, w, s=status, d=delay: stand_in_upstream(r, w, s, d), "127.0.0.1", 0)
+        servers.append(server)
+        urls[name] = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        router.backends[urls[name]] = Backend(urls[name])
+    client = Client(impersonate="chrome120")
+    try:
+        for _ in range(requests):
+            url = router.choose()
+            with router.track(url) as probe:
+                r = await client.get(f"{url}/backend-api/conversation")
+                probe.done(r.status_code)
+    finally:
+        await client.close()
+        await session_pool.close()
+        for server in servers:
+            server.close()
+    return {name: router.backends[url] for name, url in urls.items()}
+
+
+def test_router_opens_broken_backend_and_prefers_fast_one():
+    backends = asyncio.run(route_through_stand_ins())
+    assert backends["broken"].breaker.state == CircuitBreaker.OPEN
+    assert backends["broken"].requests <= backends["broken"].breaker.failure_threshold
+    assert backends["fast"].requests > backends["slow"].requests * 3
+    assert backends["fast"].breaker.state == CircuitBreaker.CLOSED
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_half_open_allows_one_probe():
+    breaker = open_breaker()
+    assert breaker.available()
+    breaker.on_start()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.available()
+
+
+def test_half_open_probe_success_closes():
+    breaker = open_breaker()
+    breaker.on_start()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = open_breaker()
+    breaker.on_start()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_probe_returns_its_slot():
+    router = BackendRouter(["http://backend"])
+    breaker = router.backends["http://backend"].breaker
+    breaker.recovery_timeout = 0
+    breaker.trip()
+
+    async def cancelled_request():
+        with router.track("http://backend"):
+            await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(cancelled_request())
+        await asyncio.sleep(0)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert router.choose(fail_fast=True) is None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert router.choose(fail_fast=True) == "http://backend"
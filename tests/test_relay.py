@@ -0,0 +1,74 @@
+import asyncio
+
+from starlette.requests import ClientDisconnect
+
+from utils.relay import StreamRelay
+
+
+class Request:
+    class url:
+        path = "/v1/chat/completions"
+
+    async def is_disconnected(self):
+        return False
+
+
+def start_stream(relay, chunks=3):
+    closed = []
+    started = []
+
+    async def source():
+        started.append(True)
+        for i in range(chunks):
+            yield f"data: {i}\n\n".encode()
+
+    async def on_close():
+        closed.append(True)
+
+    response = relay.response(Request(), source(), on_close)
+    return response, started, closed
+
+
+async def receive():
+    await asyncio.sleep(10)
+    return {"type": "http.disconnect"}
+
+
+def test_relay_streams_and_releases_once():
+    async def main():
+        relay = StreamRelay(buffer_size=2, poll_interval=1)
+        response, started, closed = start_stream(relay)
+        bodies = []
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                bodies.append(message.get("body", b""))
+
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        await asyncio.gather(*relay.tasks)
+        return relay, bodies, closed
+
+    relay, bodies, closed = asyncio.run(main())
+    assert b"".join(bodies) == b"data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    assert closed == [True]
+    assert relay.completed == 1 and relay.active == 0
+
+
+def test_relay_releases_when_body_is_never_iterated():
+    async def main():
+        relay = StreamRelay(buffer_size=2, poll_interval=1)
+        response, started, closed = start_stream(relay)
+
+        async def send(message):
+            raise OSError("client went away")
+
+        try:
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        except ClientDisconnect:
+            pass
+        await asyncio.gather(*relay.tasks)
+        return started, closed
+
+    started, closed = asyncio.run(main())
+    assert started == []
+    assert closed == [True]
@@ -0,0 +1,69 @@
+import itertools
+import random
+
+import pytest
+import tiktoken
+import tiktoken_ext.openai_public as openai_public
+
+import api.tokens as tokens
+from api.tokens import TokenCounter
+
+# 测试环境无法下载 BPE 文件，使用真实的预分词规则和合成的合并表
+alphabet = "abcdeHlosu \n./,'-#0123456789中文字"
+
+
+def build_encoding(name, monkeypatch):
+    monkeypatch.setattr(openai_public, "load_tiktoken_bpe", lambda *args, **kwargs: {})
+    pat_str = getattr(openai_public, name)()["pat_str"]
+    ranks = {bytes([i]): i for i in range(256)}
+    pieces = sorted({c.encode("utf-8") for c in alphabet} | {b"\xe4\xb8", b"\xe6\x96"})
+    for a, b in itertools.product(pieces, repeat=2):
+        ranks.setdefault(a + b, len(ranks))
+    encoding = tiktoken.Encoding(name, pat_str=pat_str, mergeable_ranks=ranks,
+                                 special_tokens={"<|endoftext|>": 100257, "<|endofprompt|>": 100276})
+    monkeypatch.setattr(tokens, "get_encoding", lambda model=None: encoding)
+    return encoding
+
+
+def feed(text, step):
+    counter = TokenCounter()
+    for i in range(0, len(text), step):
+        counter.feed(text[i:i + step])
+    return counter
+
+
+@pytest.mark.parametrize("name", ["cl100k_base", "o200k_base"])
+@pytest.mark.parametrize("text", [
+    "see foo.\n/usr/bin",
+    "path:\n\n/etc/hosts and more.\n/tmp",
+    "end.\n\n\nnext line\n- item\n/ slash",
+    "Models end with <|endoftext|> as plain text.\nThe rest <|endofprompt|> still counts.",
+])
+def test_incremental_count_matches_full_encode(name, text, monkeypatch):
+    encoding = build_encoding(name, monkeypatch)
+    expected = encoding.encode(text, disallowed_special=())
+    for step in range(1, 6):
+        counter = feed(text, step)
+        assert counter.count() == len(expected)
+        assert counter.split(len(expected)) == (text, len(expected), "length")
+        assert counter.split(len(expected) + 1) == (text, len(expected), "stop")
+        assert counter.split(5) == (encoding.decode(expected[:5]), 5, "length")
+
+
+@pytest.mark.parametrize("name", ["cl100k_base", "o200k_base"])
+def test_random_text_matches_full_encode(name, monkeypatch):
+    encoding = build_encoding(name, monkeypatch)
+    rng = random.Random(0)
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 400)))
+        counter = feed(text, rng.randint(1, 8))
+        assert counter.count() == len(encoding.encode(text, disallowed_special=()))
+
+
+@pytest.mark.parametrize("name", ["cl100k_base", "o200k_base"])
+def test_text_without_boundaries_stays_bounded(name, monkeypatch):
+    encoding = build_encoding(name, monkeypatch)
+    text = "中文字，文字中。" * 200
+    counter = feed(text, 3)
+    assert len(counter.pending) <= tokens.pending_limit + 3
+    assert counter.count() == len(encoding.encode(text))
@@ -1,10 +1,106 @@
-import random
+import asyncio
+import time
 
-from curl_cffi.requests import AsyncSession
+from curl_cffi.requests import AsyncSession, Cookies
+
+from utils.Logger import logger
+from utils.balancer import proxy_balancer
+from utils.config import session_max_clients, session_idle_timeout
+
+
+class SessionPool:
+    def __init__(self, max_clients=session_max_clients, idle_timeout=session_idle_timeout):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.last_evict = time.time()
+        self.tasks = set()
+
+    # 预热不算作使用，否则没有实际请求的会话会一直被预热、不会被回收
+    def acquire(self, proxy=None, impersonate='safari15_3', verify=True, touch=True):
+        key = (proxy, impersonate, verify)
+        entry = self.sessions.get(key)
+        if entry is None:
+            session = AsyncSession(proxies={"http": proxy, "https": proxy}, impersonate=impersonate, verify=verify,
+                                   max_clients=self.max_clients)
+            entry = {"session": session, "borrowers": 0, "last_used": time.time()}
+            self.sessions[key] = entry
+        entry["borrowers"] += 1
+        if touch:
+            entry["last_used"] = time.time()
+        self.maybe_evict()
+        return key, entry["session"]
+
+    def release(self, key, touch=True):
+        entry = self.sessions.get(key)
+        if entry:
+            entry["borrowers"] = max(entry["borrowers"] - 1, 0)
+            if touch:
+                entry["last_used"] = time.time()
+
+    def recent(self):
+        now = time.time()
+        return [key for key, entry in self.sessions.items()
+                if entry["borrowers"] > 0 or now - entry["last_used"] <= self.idle_timeout]
+
+    def maybe_evict(self):
+        now = time.time()
+        if now - self.last_evict < min(self.idle_timeout, 30):
+            return
+        self.last_evict = now
+        for key, entry in list(self.sessions.items()):
+            if entry["borrowers"] == 0 and now - entry["last_used"] > self.idle_timeout:
+                del self.sessions[key]
+                task = asyncio.create_task(self.close_session(entry["session"]))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    async def warmup(self, url, proxy=None, impersonate='safari15_3', verify=True, connections=1, timeout=10):
+        key, session = self.acquire(proxy, impersonate, verify, touch=False)
+        try:
+            results = await asyncio.gather(
+                *[session.head(url, timeout=timeout, allow_redirects=False) for _ in range(connections)],
+                return_exceptions=True
+            )
+        finally:
+            session.cookies.clear()
+            self.release(key, touch=False)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.warning(f"Warm-up {url} via {proxy}: {len(errors)}/{connections} failed, {errors[0]}")
+        return len(results) - len(errors)
+
+    @staticmethod
+    async def close_session(session):
+        try:
+            await session.close()
+        except Exception as e:
+            logger.error(f"Failed to close pooled session: {e}")
+
+    async def close(self):
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for entry in sessions:
+            await self.close_session(entry["session"])
+
+    def stats(self):
+        return [
+            {
+                "proxy": key[0],
+                "impersonate": key[1],
+                "borrowers": entry["borrowers"],
+                "idle": round(time.time() - entry["last_used"], 1),
+            }
+            for key, entry in self.sessions.items()
+        ]
+
+
+session_pool = SessionPool()
 
 
 class Client:
     def __init__(self, proxy=None, timeout=15, verify=True, impersonate='safari15_3'):
+        self.proxy = proxy
         self.proxies = {"http": proxy, "https": proxy}
         self.timeout = timeout
         self.verify = verify
@@ -15,42 +111,57 @@ class Client:
         # self.ja3 = ""
         # self.akamai = ""
         # ja3=self.ja3, akamai=self.akamai
-        self.session = AsyncSession(proxies=self.proxies, timeout=self.timeout, impersonate=self.impersonate, verify=self.verify)
-        self.session2 = AsyncSession(proxies=self.proxies, timeout=self.timeout, impersonate=self.impersonate, verify=self.verify)
+        # Sessions are shared process-wide per (proxy, impersonate), so cookies are kept per Client.
+        self.key, self.session = session_pool.acquire(proxy, self.impersonate, self.verify)
+        self.cookies = Cookies()
+        self.streams = []
 
-    async def post(self, *args, **kwargs):
-        r = await self.session.post(*args, **kwargs)
+    async def request(self, method, url, *args, cookies=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        request_cookies = Cookies(self.cookies)
+        if cookies:
+            request_cookies.update(cookies)
+        tracked = self.proxy in proxy_balancer
+        start = proxy_balancer.start(self.proxy) if tracked else None
+        ok = None
+        try:
+            r = await self.session.request(method, url, *args, cookies=request_cookies, **kwargs)
+            ok = r.status_code != 407
+        except Exception:
+            ok = False
+            raise
+        finally:
+            if tracked:
+                proxy_balancer.finish(self.proxy, start, ok)
+        self.session.cookies.clear()
+        self.cookies.update(r.cookies)
+        if kwargs.get("stream"):
+            self.streams.append(r)
         return r
 
-    async def post_stream(self, *args, headers=None, cookies=None, **kwargs):
-        if self.session:
-            headers = headers or self.session.headers
-            cookies = cookies or self.session.cookies
-        r = await self.session2.post(*args, headers=headers, cookies=cookies, **kwargs)
+    async def post(self, *args, **kwargs):
+        r = await self.request("POST", *args, **kwargs)
         return r
 
-    async def get(self, *args, **kwargs):
-        r = await self.session.get(*args, **kwargs)
+    async def post_stream(self, *args, **kwargs):
+        r = await self.request("POST", *args, **kwargs)
         return r
 
-    async def request(self, *args, **kwargs):
-        r = await self.session.request(*args, **kwargs)
+    async def get(self, *args, **kwargs):
+        r = await self.request("GET", *args, **kwargs)
         return r
 
     async def put(self, *args, **kwargs):
-        r = await self.session.put(*args, **kwargs)
+        r = await self.request("PUT", *args, **kwargs)
         return r
 
     async def close(self):
-        if self.session:
-            try:
-                await self.session.close()
-                del self.session
-            except Exception:
-                pass
-        if self.session2:
+        for r in self.streams:
             try:
-                await self.session2.close()
-                del self.session2
+                await r.aclose()
             except Exception:
                 pass
+        self.streams = []
+        if self.session:
+            session_pool.release(self.key)
+            self.session = None
@@ -0,0 +1,278 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+from utils.Logger import logger
+from utils.config import (
+    proxy_url_list,
+    proxy_eject_failures,
+    proxy_cooldown,
+    chatgpt_base_url_list,
+    backend_failure_threshold,
+    backend_recovery_timeout,
+)
+
+
+class EndpointStats:
+    def __init__(self, name, alpha=0.3, eject_failures=proxy_eject_failures, cooldown=proxy_cooldown,
+                 max_cooldown=600):
+        self.name = name
+        # 代理地址可能带有用户名和密码，日志和统计只使用去掉认证信息的地址
+        parts = urlsplit(name)
+        self.label = f"{parts.scheme}://{parts.netloc.rpartition('@')[2]}" if parts.netloc else name.rpartition("@")[2]
+        self.alpha = alpha
+        self.eject_failures = eject_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.latency = None
+        self.error_rate = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0
+
+    def start(self):
+        self.inflight += 1
+        self.requests += 1
+        return time.time()
+
+    def finish(self, start, ok):
+        self.inflight = max(self.inflight - 1, 0)
+        if ok is None:
+            return
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            latency = time.time() - start
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            self.consecutive_failures = 0
+        else:
+            self.errors += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.eject_failures:
+                exponent = self.consecutive_failures - self.eject_failures
+                cooldown = min(self.cooldown * 2 ** exponent, self.max_cooldown)
+                self.ejected_until = time.time() + cooldown
+                logger.warning(f"Eject {self.label} for {cooldown}s after {self.consecutive_failures} failures")
+
+    def available(self, now=None):
+        return (now or time.time()) >= self.ejected_until
+
+    def score(self, default_latency=0.0):
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + self.inflight) / max(1 - self.error_rate, 0.05)
+
+    def stats(self):
+        return {
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected_for": max(round(self.ejected_until - time.time(), 1), 0),
+        }
+
+
+class ProxyBalancer:
+    def __init__(self, proxies):
+        self.endpoints = {proxy: EndpointStats(proxy) for proxy in proxies}
+
+    def __contains__(self, proxy):
+        return proxy in self.endpoints
+
+    def choose(self):
+        if not self.endpoints:
+            return None
+        now = time.time()
+        endpoints = list(self.endpoints.values())
+        candidates = [e for e in endpoints if e.available(now)]
+        if not candidates:
+            return min(endpoints, key=lambda e: e.ejected_until).name
+        if len(candidates) == 1:
+            return candidates[0].name
+        first, second = random.sample(candidates, 2)
+        return first.name if first.score() <= second.score() else second.name
+
+    def start(self, proxy):
+        return self.endpoints[proxy].start()
+
+    def finish(self, proxy, start, ok):
+        self.endpoints[proxy].finish(start, ok)
+
+    def stats(self):
+        stats = {}
+        for endpoint in self.endpoints.values():
+            # 同一代理网关的不同账号去掉认证信息后地址相同，加序号区分
+            label = endpoint.label if endpoint.label not in stats else f"{endpoint.label}#{len(stats)}"
+            stats[label] = endpoint.stats()
+        return stats
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=backend_failure_threshold, recovery_timeout=backend_recovery_timeout,
+                 half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probes = 0
+        self.opened_at = 0
+
+    def available(self, now=None):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return (now or time.time()) - self.opened_at >= self.recovery_timeout
+        return self.probes < self.half_open_probes
+
+    def on_start(self):
+        if self.state == self.OPEN and self.available():
+            self.state = self.HALF_OPEN
+            self.probes = 0
+        if self.state == self.HALF_OPEN:
+            self.probes += 1
+
+    def record(self, ok):
+        if self.state == self.HALF_OPEN:
+            self.probes = max(self.probes - 1, 0)
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+            else:
+                self.trip()
+        elif ok:
+            self.failures = 0
+        else:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.trip()
+
+    # 请求被取消时不记录结果，只归还半开状态下占用的探测名额
+    def release(self):
+        if self.state == self.HALF_OPEN:
+            self.probes = max(self.probes - 1, 0)
+
+    def trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.probes = 0
+
+
+class Backend:
+    def __init__(self, url, alpha=0.2):
+        self.url = url
+        self.alpha = alpha
+        self.ttfb = None
+        self.server_error_rate = 0.0
+        self.spinner_rate = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.breaker = CircuitBreaker()
+
+    def ewma(self, value, sample):
+        return sample if value is None else value + self.alpha * (sample - value)
+
+    def record(self, ttfb, ok, server_error=False, spinner=False):
+        if ok and ttfb is not None:
+            self.ttfb = self.ewma(self.ttfb, ttfb)
+        self.server_error_rate = self.ewma(self.server_error_rate, 1.0 if server_error or ttfb is None else 0.0)
+        self.spinner_rate = self.ewma(self.spinner_rate, 1.0 if spinner else 0.0)
+        previous = self.breaker.state
+        self.breaker.record(ok)
+        if self.breaker.state != previous:
+            logger.warning(f"Backend {self.url} circuit {previous} -> {self.breaker.state}")
+
+    def weight(self, default_ttfb):
+        ttfb = self.ttfb if self.ttfb is not None else default_ttfb
+        failure_rate = min(self.server_error_rate + self.spinner_rate, 0.95)
+        return (1 - failure_rate) / (max(ttfb, 0.001) * (1 + self.inflight))
+
+    def stats(self):
+        return {
+            "ttfb_ms": round(self.ttfb * 1000, 1) if self.ttfb is not None else None,
+            "server_error_rate": round(self.server_error_rate, 3),
+            "spinner_rate": round(self.spinner_rate, 3),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "circuit": self.breaker.state,
+        }
+
+
+class BackendRouter:
+    def __init__(self, urls):
+        self.backends = {url: Backend(url) for url in urls}
+
+    def choose(self, fail_fast=False):
+        if not self.backends:
+            return None
+        now = time.time()
+        backends = list(self.backends.values())
+        candidates = [b for b in backends if b.breaker.available(now)]
+        if not candidates:
+            if fail_fast:
+                return None
+            return min(backends, key=lambda b: b.breaker.opened_at).url
+        known = [b.ttfb for b in candidates if b.ttfb is not None]
+        default_ttfb = min(known) if known else 1.0
+        weights = [b.weight(default_ttfb) for b in candidates]
+        return random.choices(candidates, weights=weights)[0].url
+
+    def track(self, url):
+        return BackendProbe(self, url)
+
+    def start(self, url):
+        backend = self.backends.get(url)
+        if backend:
+            backend.inflight += 1
+            backend.requests += 1
+            backend.breaker.on_start()
+        return time.time()
+
+    def finish(self, url, start, status_code=None, spinner=False, cancelled=False):
+        backend = self.backends.get(url)
+        if not backend:
+            return
+        backend.inflight = max(backend.inflight - 1, 0)
+        if cancelled:
+            backend.breaker.release()
+            return
+        server_error = status_code is not None and status_code >= 500
+        ok = status_code is not None and not server_error and not spinner
+        backend.record(time.time() - start if status_code is not None else None, ok, server_error, spinner)
+
+    def stats(self):
+        return {url: backend.stats() for url, backend in self.backends.items()}
+
+
+class BackendProbe:
+    def __init__(self, router, url):
+        self.router = router
+        self.url = url
+        self.start = None
+        self.finished = False
+
+    def __enter__(self):
+        self.start = self.router.start(self.url)
+        return self
+
+    def done(self, status_code, spinner=False):
+        if not self.finished:
+            self.finished = True
+            self.router.finish(self.url, self.start, status_code, spinner)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.finished:
+            self.finished = True
+            self.router.finish(self.url, self.start, cancelled=exc_type is asyncio.CancelledError)
+        return False
+
+
+proxy_balancer = ProxyBalancer(proxy_url_list)
+backend_router = BackendRouter(chatgpt_base_url_list)
+
@@ -0,0 +1,211 @@
+import json
+from typing import Any
+
+from utils.Logger import logger
+from utils.config import json_codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class JsonCodec:
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def encode(self, obj):
+        return self.dumps(obj).encode("utf-8")
+
+    # 上游 SSE 事件，只需要 stream_response 读取的字段
+    def loads_event(self, data):
+        return self.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def encode(self, obj):
+        return orjson.dumps(obj)
+
+
+if msgspec is not None:
+    UNSET = msgspec.UNSET
+
+    class Author(msgspec.Struct):
+        role: Any = UNSET
+
+    class Metadata(msgspec.Struct):
+        initial_text: Any = UNSET
+        model_slug: Any = UNSET
+        citations: Any = UNSET
+        finished_text: Any = UNSET
+
+    class Message(msgspec.Struct):
+        id: Any = UNSET
+        author: Author = UNSET
+        status: Any = UNSET
+        content: Any = UNSET
+        recipient: Any = UNSET
+        metadata: Metadata = UNSET
+        end_turn: Any = UNSET
+
+    class Event(msgspec.Struct):
+        message: Message = UNSET
+        conversation_id: Any = UNSET
+        type: Any = UNSET
+        error: Any = UNSET
+
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        self.decoder = msgspec.json.Decoder()
+        self.event_decoder = msgspec.json.Decoder(Event)
+        self.encoder = msgspec.json.Encoder()
+
+    def loads(self, data):
+        return self.decoder.decode(data)
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj).decode("utf-8")
+
+    def encode(self, obj):
+        return self.encoder.encode(obj)
+
+    # 跳过 metadata 中的搜索结果、引用详情等未读取的字段，未出现的字段不会出现在结果中
+    def loads_event(self, data):
+        try:
+            return msgspec.to_builtins(self.event_decoder.decode(data))
+        except msgspec.ValidationError:
+            # 结构与预期不符（如 message 为 null）时按原样解析，保持与标准库一致的行为
+            return self.decoder.decode(data)
+
+
+codecs = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+
+def get_codec(name="auto"):
+    available = [n for n, m in (("msgspec", msgspec), ("orjson", orjson)) if m is not None] + ["json"]
+    if name == "auto":
+        name = available[0]
+    elif name not in available:
+        logger.warning(f"JSON codec {name} is not available, using {available[0]}")
+        name = available[0]
+    return codecs[name]()
+
+
+codec = get_codec(json_codec)
+
+
+if __name__ == "__main__":
+    import asyncio
+    import random
+    import string
+    import time
+
+    # 模拟一次带搜索引用的回答：每个事件重发完整的 parts，metadata 中附带大量未读取的字段
+    def build_corpus(length=6000, step=6):
+        words = "".join(random.choice(string.ascii_letters + " " * 8) for _ in range(length))
+        search_results = [{"title": f"Result {i}", "url": f"https://example.com/{i}", "snippet": words[:300],
+                           "attribution": "example.com", "pub_date": None} for i in range(10)]
+        citations = []
+        events = []
+        for end in range(step, length + step, step):
+            if end % 1500 == 0:
+                citations.append({"start_ix": end, "end_ix": end + 10, "metadata": {
+                    "title": f"Result {len(citations)}", "url": f"https://example.com/{len(citations)}",
+                    "text": words[:200], "type": "webpage"}})
+            finished = end >= length
+            event = {
+                "message": {
+                    "id": "b8d1c5f3-0a8f-4b62-9b61-2d8d0c6d2d7a",
+                    "author": {"role": "assistant", "name": None, "metadata": {}},
+                    "create_time": 1718000000.0,
+                    "update_time": None,
+                    "content": {"content_type": "text", "parts": [words[:end]]},
+                    "status": "finished_successfully" if finished else "in_progress",
+                    "end_turn": True if finished else None,
+                    "weight": 1.0,
+                    "metadata": {
+                        "citations": list(citations),
+                        "content_references": [],
+                        "search_result_groups": [{"type": "search_result_group", "domain": "example.com",
+                                                  "entries": search_results}],
+                        "gizmo_id": None,
+                        "message_type": "next",
+                        "model_slug": "gpt-4o",
+                        "default_model_slug": "gpt-4o",
+                        "parent_id": "aaa2b5c1-6f1d-4b9a-8a3c-1f2e3d4c5b6a",
+                    },
+                    "recipient": "all",
+                    "channel": None,
+                },
+                "conversation_id": "6672f2a1-59e4-800c-9a35-2c1e4f0a0b1d",
+                "error": None,
+            }
+            events.append(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        events.append(b"data: [DONE]\n\n")
+        return events
+
+    class Service:
+        history_disabled = True
+        include_usage = False
+        prompt_tokens = 0
+
+    async def replay(corpus):
+        for line in corpus:
+            yield line
+
+    async def translate(corpus):
+        from chatgpt.chatFormat import stream_response
+        chunks = []
+        async for chunk in stream_response(Service(), replay(corpus), "gpt-4o", 1 << 30):
+            chunks.append(chunk)
+        return chunks
+
+    async def main():
+        import chatgpt.chatFormat as chatFormat
+        random.seed(0)
+        corpus = build_corpus()
+        size = sum(len(line) for line in corpus)
+        print(f"corpus: {len(corpus)} events, {size / 1024 / 1024:.1f} MiB")
+        reference = None
+        for name in ["json", "orjson", "msgspec"]:
+            chatFormat.codec = get_codec(name)
+            if chatFormat.codec.name != name:
+                continue
+            start = time.perf_counter()
+            for line in corpus[:-1]:
+                chatFormat.codec.loads_event(line[6:])
+            decode = time.perf_counter() - start
+            start = time.perf_counter()
+            chunks = await translate(corpus)
+            elapsed = time.perf_counter() - start
+            texts = [json.loads(chunk[6:])["choices"][0]["delta"].get("content", "") for chunk in chunks[:-1]]
+            reference = reference or texts
+            print(f"{name:8s} decode: {len(corpus) / decode:8.0f} events/s, "
+                  f"stream_response: {len(corpus) / elapsed:8.0f} events/s, identical: {texts == reference}")
+
+    asyncio.run(main())
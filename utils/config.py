@@ -34,9 +34,22 @@ export_proxy_url = os.getenv('EXPORT_PROXY_URL', None)
 
 cf_file_url = os.getenv('CF_FILE_URL', None)
 turnstile_solver_url = os.getenv('TURNSTILE_SOLVER_URL', None)
+turnstile_mode = os.getenv('TURNSTILE_MODE', 'remote' if turnstile_solver_url else 'local')
 
 history_disabled = is_true(os.getenv('HISTORY_DISABLED', True))
 pow_difficulty = os.getenv('POW_DIFFICULTY', '000032')
+pow_workers = int(os.getenv('POW_WORKERS', os.cpu_count() or 1))
+pow_chunk_size = int(os.getenv('POW_CHUNK_SIZE', 10000))
+pow_deadline = float(os.getenv('POW_DEADLINE', 5))
+requirements_reservoir_size = int(os.getenv('REQUIREMENTS_RESERVOIR_SIZE', 4))
+ark0se_reservoir_size = int(os.getenv('ARK0SE_RESERVOIR_SIZE', 2))
+ark0se_token_ttl = int(os.getenv('ARK0SE_TOKEN_TTL', 120))
+sentinel_timeout = int(os.getenv('SENTINEL_TIMEOUT', 20))
+json_codec = os.getenv('JSON_CODEC', 'auto')
+stream_buffer_size = int(os.getenv('STREAM_BUFFER_SIZE', 32))
+stream_disconnect_poll = float(os.getenv('STREAM_DISCONNECT_POLL', 1))
+sentinel_prefetch_ttl = int(os.getenv('SENTINEL_PREFETCH_TTL', 60))
+sentinel_prefetch_concurrency = int(os.getenv('SENTINEL_PREFETCH_CONCURRENCY', 20))
 retry_times = int(os.getenv('RETRY_TIMES', 3))
 enable_gateway = is_true(os.getenv('ENABLE_GATEWAY', False))
 conversation_only = is_true(os.getenv('CONVERSATION_ONLY', False))
@@ -44,6 +57,28 @@ enable_limit = is_true(os.getenv('ENABLE_LIMIT', True))
 upload_by_url = is_true(os.getenv('UPLOAD_BY_URL', False))
 check_model = is_true(os.getenv('CHECK_MODEL', False))
 scheduled_refresh = is_true(os.getenv('SCHEDULED_REFRESH', False))
+session_max_clients = int(os.getenv('SESSION_MAX_CLIENTS', 1000))
+session_idle_timeout = int(os.getenv('SESSION_IDLE_TIMEOUT', 300))
+proxy_eject_failures = int(os.getenv('PROXY_EJECT_FAILURES', 3))
+proxy_cooldown = int(os.getenv('PROXY_COOLDOWN', 30))
+backend_failure_threshold = int(os.getenv('BACKEND_FAILURE_THRESHOLD', 5))
+backend_recovery_timeout = int(os.getenv('BACKEND_RECOVERY_TIMEOUT', 30))
+db_pool_minsize = int(os.getenv('DB_POOL_MINSIZE', 1))
+db_pool_maxsize = int(os.getenv('DB_POOL_MAXSIZE', 10))
+redis_max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+auth_key_local_cache_size = int(os.getenv('AUTH_KEY_LOCAL_CACHE_SIZE', 10000))
+auth_key_local_ttl = int(os.getenv('AUTH_KEY_LOCAL_TTL', 60))
+auth_key_negative_ttl = int(os.getenv('AUTH_KEY_NEGATIVE_TTL', 10))
+auth_key_early_refresh_beta = float(os.getenv('AUTH_KEY_EARLY_REFRESH_BETA', 1.0))
+get_ak_concurrency = int(os.getenv('GET_AK_CONCURRENCY', 8))
+get_ak_timeout = int(os.getenv('GET_AK_TIMEOUT', 10))
+refresh_concurrency = int(os.getenv('REFRESH_CONCURRENCY', 10))
+refresh_rate = float(os.getenv('REFRESH_RATE', 5))
+refresh_save_batch = int(os.getenv('REFRESH_SAVE_BATCH', 100))
+dpl_refresh_interval = int(os.getenv('DPL_REFRESH_INTERVAL', 900))
+warmup_connections = int(os.getenv('WARMUP_CONNECTIONS', 2))
+warmup_interval = int(os.getenv('WARMUP_INTERVAL', 60))
+warmup_timeout = int(os.getenv('WARMUP_TIMEOUT', 30))
 
 authorization_list = authorization.split(',') if authorization else []
 chatgpt_base_url_list = chatgpt_base_url.split(',') if chatgpt_base_url else []
@@ -67,18 +102,46 @@ logger.info("------------------------- Request --------------------------")
 logger.info("CHATGPT_BASE_URL:  " + str(chatgpt_base_url_list))
 logger.info("PROXY_URL:         " + str(proxy_url_list))
 logger.info("EXPORT_PROXY_URL:  " + str(export_proxy_url))
+logger.info("BACKEND_FAILURE_THRESHOLD: " + str(backend_failure_threshold))
+logger.info("BACKEND_RECOVERY_TIMEOUT:  " + str(backend_recovery_timeout))
+logger.info("PROXY_EJECT_FAILURES: " + str(proxy_eject_failures))
+logger.info("PROXY_COOLDOWN:       " + str(proxy_cooldown))
+logger.info("SESSION_MAX_CLIENTS:  " + str(session_max_clients))
+logger.info("SESSION_IDLE_TIMEOUT: " + str(session_idle_timeout))
+logger.info("WARMUP_CONNECTIONS:   " + str(warmup_connections))
+logger.info("WARMUP_INTERVAL:      " + str(warmup_interval))
+logger.info("DPL_REFRESH_INTERVAL: " + str(dpl_refresh_interval))
 logger.info("---------------------- Functionality -----------------------")
 logger.info("HISTORY_DISABLED:  " + str(history_disabled))
 logger.info("POW_DIFFICULTY:    " + str(pow_difficulty))
+logger.info("POW_WORKERS:       " + str(pow_workers))
+logger.info("POW_CHUNK_SIZE:    " + str(pow_chunk_size))
+logger.info("POW_DEADLINE:      " + str(pow_deadline))
+logger.info("REQUIREMENTS_RESERVOIR_SIZE: " + str(requirements_reservoir_size))
+logger.info("SENTINEL_TIMEOUT:  " + str(sentinel_timeout))
+logger.info("TURNSTILE_MODE:    " + str(turnstile_mode))
+logger.info("ARK0SE_RESERVOIR_SIZE: " + str(ark0se_reservoir_size))
+logger.info("SENTINEL_PREFETCH_TTL: " + str(sentinel_prefetch_ttl))
+logger.info("JSON_CODEC:        " + str(json_codec))
+logger.info("STREAM_BUFFER_SIZE: " + str(stream_buffer_size))
+logger.info("STREAM_DISCONNECT_POLL: " + str(stream_disconnect_poll))
 logger.info("RETRY_TIMES:       " + str(retry_times))
 logger.info("CONVERSATION_ONLY: " + str(conversation_only))
 logger.info("ENABLE_LIMIT:      " + str(enable_limit))
 logger.info("UPLOAD_BY_URL:     " + str(upload_by_url))
 logger.info("CHECK_MODEL:       " + str(check_model))
 logger.info("SCHEDULED_REFRESH: " + str(scheduled_refresh))
+logger.info("REFRESH_CONCURRENCY: " + str(refresh_concurrency))
+logger.info("REFRESH_RATE:        " + str(refresh_rate))
 logger.info("RANDOM_TOKEN:      " + str(random_token))
 logger.info("------------------------- Gateway --------------------------")
 logger.info("ENABLE_GATEWAY:    " + str(enable_gateway))
+logger.info("------------------------- Database -------------------------")
+logger.info("DB_POOL_MINSIZE:   " + str(db_pool_minsize))
+logger.info("DB_POOL_MAXSIZE:   " + str(db_pool_maxsize))
+logger.info("REDIS_MAX_CONNECTIONS: " + str(redis_max_connections))
+logger.info("AUTH_KEY_LOCAL_TTL:    " + str(auth_key_local_ttl))
+logger.info("AUTH_KEY_NEGATIVE_TTL: " + str(auth_key_negative_ttl))
 
 logger.info("-" * 60)
 
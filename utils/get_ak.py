@@ -1,9 +1,21 @@
-from utils.Logger import logger
-import requests
 import asyncio
+import time
+
+import chatgpt.globals as globals
+from chatgpt.refreshToken import save_refresh_map
+from utils.Client import Client
+from utils.Logger import logger
+from utils.config import get_ak_concurrency, get_ak_timeout
+
+get_ak_semaphore = asyncio.Semaphore(get_ak_concurrency)
+
 
 # 异步获取 ak
-async def get_ak(refresh_token):
+async def get_ak(refresh_token, save=True):
+    cached = globals.refresh_map.get(refresh_token, {})
+    if cached.get("token") and int(time.time()) - cached.get("timestamp", 0) < 5 * 24 * 60 * 60:
+        return cached["token"]
+
     url = "https://token.oaifree.com/api/auth/refresh"
     headers = {
         "Content-Type": "application/x-www-form-urlencoded"
@@ -11,13 +23,29 @@ async def get_ak(refresh_token):
     data = {
         "refresh_token": refresh_token
     }
-    try:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, requests.post, url, data, headers)
-        if response.status_code == 200:
-            return response.json()['access_token']
-        else:
+    async with get_ak_semaphore:
+        client = Client(timeout=get_ak_timeout)
+        try:
+            response = await client.post(url, data=data, headers=headers)
+            if response.status_code == 200:
+                access_token = response.json()['access_token']
+                globals.refresh_map[refresh_token] = {"token": access_token, "timestamp": int(time.time())}
+                if save:
+                    save_refresh_map(globals.refresh_map)
+                return access_token
+            else:
+                return None
+        except Exception as e:
+            logger.error(f"获取 ak 时发生错误: {e}")
             return None
-    except requests.RequestException as e:
-        logger.error(f"获取 ak 时发生错误: {e}")
-        return None
\ No newline at end of file
+        finally:
+            await client.close()
+
+
+# 并发获取多个 ak，结果与输入顺序一致，refresh_map 只写一次
+async def get_aks(refresh_tokens):
+    before = [globals.refresh_map.get(refresh_token) for refresh_token in refresh_tokens]
+    access_tokens = await asyncio.gather(*[get_ak(refresh_token, save=False) for refresh_token in refresh_tokens])
+    if before != [globals.refresh_map.get(refresh_token) for refresh_token in refresh_tokens]:
+        save_refresh_map(globals.refresh_map)
+    return access_tokens
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from fastapi.responses import StreamingResponse
+
+from utils.Logger import logger
+from utils.config import stream_buffer_size, stream_disconnect_poll
+
+END = object()
+
+
+class RelayResponse(StreamingResponse):
+    def __init__(self, content, on_finish, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_finish = on_finish
+
+    # 响应体未被迭代时（如客户端在开始输出前断开）生成器的 finally 不会执行，在这里兜底释放
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_finish()
+
+
+class StreamRelay:
+    def __init__(self, buffer_size=stream_buffer_size, poll_interval=stream_disconnect_poll):
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.active = 0
+        self.completed = 0
+        self.aborted = {}
+        self.tasks = set()
+
+    @staticmethod
+    async def produce(source, queue):
+        try:
+            async for chunk in source:
+                # 队列满时暂停读取上游，慢速客户端不会让缓冲无限增长
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(END)
+
+    def response(self, request, source, on_close=None, media_type="text/event-stream"):
+        state = {"producer": None, "closed": False}
+
+        # 生成器结束和响应结束都会调用，只执行一次
+        def close():
+            if state["closed"]:
+                return
+            state["closed"] = True
+            producer = state["producer"]
+            if producer is not None and not producer.done():
+                producer.cancel()
+            # 客户端断开时当前任务可能已被取消，在独立任务中关闭上游并释放会话
+            task = asyncio.create_task(self.cleanup(producer, source, on_close))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        return RelayResponse(self.relay(request, source, state, close), close, media_type=media_type)
+
+    async def relay(self, request, source, state, close):
+        queue = asyncio.Queue(self.buffer_size)
+        self.active += 1
+        reason = None
+        next_check = time.monotonic() + self.poll_interval
+        try:
+            # 第一次迭代时才开始读取上游
+            state["producer"] = asyncio.create_task(self.produce(source, queue))
+            while True:
+                try:
+                    chunk = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    try:
+                        chunk = await asyncio.wait_for(queue.get(), max(next_check - time.monotonic(), 0))
+                    except asyncio.TimeoutError:
+                        chunk = None
+                if chunk is None or time.monotonic() >= next_check:
+                    next_check = time.monotonic() + self.poll_interval
+                    if await request.is_disconnected():
+                        reason = "client_disconnected"
+                        break
+                    if chunk is None:
+                        continue
+                if chunk is END:
+                    break
+                if isinstance(chunk, Exception):
+                    reason = "upstream_error"
+                    raise chunk
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            reason = "cancelled"
+            raise
+        finally:
+            self.active -= 1
+            if reason:
+                self.aborted[reason] = self.aborted.get(reason, 0) + 1
+                logger.info(f"Stream aborted: {reason}, {request.url.path}")
+            else:
+                self.completed += 1
+            close()
+
+    @staticmethod
+    async def cleanup(producer, source, on_close):
+        try:
+            if producer is not None:
+                await asyncio.gather(producer, return_exceptions=True)
+            await source.aclose()
+        except Exception as e:
+            logger.error(f"Failed to close upstream stream: {e}")
+        finally:
+            if on_close:
+                await on_close()
+
+    def stats(self):
+        return {
+            "buffer_size": self.buffer_size,
+            "active": self.active,
+            "completed": self.completed,
+            "aborted": self.aborted,
+        }
+
+
+stream_relay = StreamRelay()